@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模块导入耗时基准测试
+在全新的子进程中反复导入各模块，统计启动耗时，并检查API模式下是否加载了 BeautifulSoup
+
+用法:
+    python bench_import.py [--runs 20] [模块名 ...]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ['xeno_canto_scraper', 'xeno_canto_cli', 'xeno_canto_web']
+
+# 导入模块并创建API模式的爬虫实例，输出是否加载了 bs4
+PROBE = (
+    "import sys, {module}\n"
+    "import xeno_canto_scraper\n"
+    "xeno_canto_scraper.XenoCantoScraper(api_key='bench')\n"
+    "print('bs4' in sys.modules)\n"
+)
+BASELINE = "import sys\nprint('bs4' in sys.modules)\n"
+
+
+def time_import(code: str, runs: int):
+    """
+    Returns:
+        (每次耗时毫秒列表, 是否加载了bs4)
+    """
+    timings = []
+    loaded_bs4 = False
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True, text=True, check=True
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        loaded_bs4 = result.stdout.strip() == 'True'
+    return timings, loaded_bs4
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模块导入耗时基准测试")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--runs', type=int, default=20, help="每个模块的重复次数")
+    args = parser.parse_args()
+
+    baseline, _ = time_import(BASELINE, args.runs)
+    print(f"解释器启动基线: 中位数 {statistics.median(baseline):.1f} ms\n")
+    print(f"{'模块':<22}{'最小(ms)':>10}{'中位数(ms)':>12}{'净耗时(ms)':>12}  加载bs4")
+
+    for module in args.modules:
+        timings, loaded_bs4 = time_import(PROBE.format(module=module), args.runs)
+        median = statistics.median(timings)
+        print(f"{module:<22}{min(timings):>10.1f}{median:>12.1f}"
+              f"{median - statistics.median(baseline):>12.1f}  {'是' if loaded_bs4 else '否'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 声谱图/波形图资源预取
+将录音的 sono/osci 图片并发下载到本地内容寻址缓存，支持按容量淘汰和按录音ID查询本地路径
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from xeno_canto_urls import normalize_url
+
+# sono 提供 small/med/large/full 四种尺寸，osci 提供 small/med/large 三种尺寸
+SONO_SIZES = ('small', 'med', 'large', 'full')
+OSCI_SIZES = ('small', 'med', 'large')
+
+
+class AssetCache:
+    """
+    内容寻址的本地图片缓存
+
+    图片按内容的SHA-256存放在 objects/<前两位>/<哈希>.png，
+    index.json 记录每个录音ID的 "sono:med" 等资源键对应的哈希，
+    缓存总大小超过 max_bytes 时按最近访问时间淘汰最旧的对象。
+    """
+
+    def __init__(self, cache_dir: str = "asset_cache", max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.objects_dir):
+            os.makedirs(self.objects_dir)
+
+        # recordings: {录音ID: {资源键: 哈希}}，objects: {哈希: {'size': 字节数, 'atime': 最近访问时间}}
+        self._index = {'recordings': {}, 'objects': {}}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"缓存索引读取失败，将重新建立: {e}")
+
+        # objects 按最近访问时间从旧到新排列，淘汰时从头部取；
+        # _refs 记录每个哈希被哪些 (录音ID, 资源键) 引用，淘汰时无需扫描全部录音
+        objects = self._index['objects']
+        self._index['objects'] = dict(sorted(objects.items(), key=lambda item: item[1]['atime']))
+        self._total_bytes = sum(obj['size'] for obj in objects.values())
+        self._refs: Dict[str, set] = {}
+        for recording_id, keys in self._index['recordings'].items():
+            for key, digest in keys.items():
+                self._refs.setdefault(digest, set()).add((recording_id, key))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.png")
+
+    def _touch(self, digest: str, size: int):
+        # 重新插入到末尾，保持 objects 的访问顺序（调用方需持有锁）
+        old = self._index['objects'].pop(digest, None)
+        if old is not None:
+            self._total_bytes -= old['size']
+        self._index['objects'][digest] = {'size': size, 'atime': time.time()}
+        self._total_bytes += size
+
+    @property
+    def total_bytes(self) -> int:
+        """当前缓存对象的总字节数"""
+        return self._total_bytes
+
+    def has(self, recording_id: str, key: str) -> bool:
+        """
+        检查某个录音的资源是否已在缓存中
+        """
+        with self._lock:
+            digest = self._index['recordings'].get(str(recording_id), {}).get(key)
+            return bool(digest) and os.path.exists(self._object_path(digest))
+
+    def put(self, recording_id: str, key: str, content: bytes) -> Optional[str]:
+        """
+        写入一个资源并返回其本地路径
+
+        Args:
+            recording_id: 录音ID
+            key: 资源键，如 "sono:med"
+            content: 图片内容
+
+        Returns:
+            本地文件路径，图片大于缓存上限而未写入时返回None
+        """
+        if len(content) > self.max_bytes:
+            print(f"资源 {recording_id} {key} 大小 {len(content)} 字节超过缓存上限，未缓存")
+            return None
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        recording_id = str(recording_id)
+
+        # 先在锁外写临时文件，持锁时只改名和更新索引，避免并发下载互相等待磁盘写入
+        tmp_path = None
+        if not os.path.exists(path):
+            tmp_path = self._write_tmp(path, content)
+
+        with self._lock:
+            if tmp_path is not None:
+                os.replace(tmp_path, path)
+            elif not os.path.exists(path):
+                # 检查之后对象恰好被淘汰
+                os.replace(self._write_tmp(path, content), path)
+
+            self._touch(digest, len(content))
+            keys = self._index['recordings'].setdefault(recording_id, {})
+            old_digest = keys.get(key)
+            if old_digest and old_digest != digest:
+                self._refs.get(old_digest, set()).discard((recording_id, key))
+            keys[key] = digest
+            self._refs.setdefault(digest, set()).add((recording_id, key))
+            self._evict(keep=digest)
+
+        return path
+
+    def _write_tmp(self, path: str, content: bytes) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 临时文件名包含线程ID，并发写入同一对象时互不覆盖，改名后不会读到不完整的图片
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def get_path(self, recording_id: str, key: str) -> Optional[str]:
+        """
+        查询某个录音资源的本地路径，不存在时返回None
+        """
+        with self._lock:
+            digest = self._index['recordings'].get(str(recording_id), {}).get(key)
+            if not digest:
+                return None
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                return None
+            obj = self._index['objects'].get(digest)
+            if obj is not None:
+                self._touch(digest, obj['size'])
+            return path
+
+    def get_paths(self, recording_id: str) -> Dict[str, str]:
+        """
+        查询某个录音所有已缓存资源的本地路径
+
+        Returns:
+            {资源键: 本地路径}
+        """
+        keys = list(self._index['recordings'].get(str(recording_id), {}).keys())
+        paths = {}
+        for key in keys:
+            path = self.get_path(recording_id, key)
+            if path:
+                paths[key] = path
+        return paths
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        按最近访问时间淘汰对象，直到总大小不超过上限（调用方需持有锁）
+
+        Args:
+            keep: 不参与淘汰的对象哈希（刚写入的对象）
+        """
+        objects = self._index['objects']
+        recordings = self._index['recordings']
+        while self._total_bytes > self.max_bytes:
+            digest = next((d for d in objects if d != keep), None)
+            if digest is None:
+                break
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                os.remove(path)
+            self._total_bytes -= objects.pop(digest)['size']
+            for recording_id, key in self._refs.pop(digest, ()):
+                keys = recordings.get(recording_id)
+                if keys is not None and keys.get(key) == digest:
+                    del keys[key]
+                    if not keys:
+                        del recordings[recording_id]
+
+    def save_index(self):
+        """将索引写回磁盘"""
+        with self._lock:
+            tmp_path = self.index_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+
+
+class AssetPrefetcher:
+    """
+    并发预取录音的声谱图和波形图
+    """
+
+    def __init__(self, cache: AssetCache, session: Optional[requests.Session] = None, max_workers: int = 8):
+        self.cache = cache
+        self.session = session or requests.Session()
+        self.max_workers = max_workers
+
+    def _asset_urls(self, recording: Dict, sono_sizes: Iterable[str], osci_sizes: Iterable[str]) -> Dict[str, str]:
+        urls = {}
+        sono = recording.get('sono') or {}
+        osci = recording.get('osci') or {}
+        for size in sono_sizes:
+            if sono.get(size):
+                urls[f"sono:{size}"] = normalize_url(sono[size])
+        for size in osci_sizes:
+            if osci.get(size):
+                urls[f"osci:{size}"] = normalize_url(osci[size])
+        return urls
+
+    def _fetch(self, recording_id: str, key: str, url: str) -> bool:
+        try:
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            return self.cache.put(recording_id, key, response.content) is not None
+        except requests.RequestException as e:
+            print(f"资源下载失败 {recording_id} {key}: {e}")
+            return False
+        except OSError as e:
+            # 磁盘已满、权限不足等，不中断整批预取，已完成的资源仍会写入索引
+            print(f"资源写入缓存失败 {recording_id} {key}: {e}")
+            return False
+
+    def prefetch(self, recordings: List[Dict], sono_sizes: Iterable[str] = ('med',),
+                 osci_sizes: Iterable[str] = ('med',)) -> int:
+        """
+        将一组录音的指定尺寸图片预取到本地缓存
+
+        Args:
+            recordings: 录音数据列表（原始数据或 extract_recording_info 的结果均可）
+            sono_sizes: 要预取的声谱图尺寸
+            osci_sizes: 要预取的波形图尺寸
+
+        Returns:
+            新下载的图片数量
+        """
+        sono_sizes = tuple(sono_sizes)
+        osci_sizes = tuple(osci_sizes)
+        unknown = [s for s in sono_sizes if s not in SONO_SIZES] + [s for s in osci_sizes if s not in OSCI_SIZES]
+        if unknown:
+            raise ValueError(f"不支持的图片尺寸: {', '.join(unknown)}")
+
+        tasks = []
+        seen = set()
+        for recording in recordings:
+            recording_id = recording.get('id')
+            if not recording_id:
+                continue
+            for key, url in self._asset_urls(recording, sono_sizes, osci_sizes).items():
+                # 同一录音在输入中重复出现时只下载一次
+                if (str(recording_id), key) in seen:
+                    continue
+                seen.add((str(recording_id), key))
+                if not self.cache.has(recording_id, key):
+                    tasks.append((recording_id, key, url))
+
+        if not tasks:
+            print("所有资源均已缓存")
+            return 0
+
+        print(f"准备预取 {len(tasks)} 张图片...")
+        success_count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._fetch, *task) for task in tasks]
+            for future in as_completed(futures):
+                if future.result():
+                    success_count += 1
+
+        self.cache.save_index()
+        print(f"预取完成！成功下载 {success_count} 张图片")
+        return success_count
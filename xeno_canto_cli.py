@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 命令行采集工具
+
+子命令:
+    search    搜索单个或多个鸟类并输出结果
+    harvest   并发批量采集物种列表
+    download  根据已采集的录音数据并发下载音频
+    sync      通过任务队列增量同步（可多机运行）
+    export    导出任务队列中已合并的录音数据
+    verify    校验下载目录中的音频文件是否完整
+    serve-queue  托管任务队列供多台机器访问
+
+API密钥可通过 --api-key 或环境变量 XENO_CANTO_API_KEY 提供。
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from xeno_canto_scraper import XenoCantoScraper
+from xeno_canto_transport import get_shared_transport
+
+OUTPUT_FORMATS = ('json', 'csv', 'ndjson')
+
+
+class Progress:
+    """
+    线程安全的进度和吞吐量统计
+    """
+
+    def __init__(self, total: int, label: str, unit: str = "项"):
+        self.total = total
+        self.label = label
+        self.unit = unit
+        self.done = 0
+        self.failed = 0
+        self.items = 0
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, ok: bool = True, items: int = 0, name: str = ""):
+        with self._lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            self.items += items
+            elapsed = max(time.time() - self.start, 1e-6)
+            print(f"[{self.done}/{self.total}] {self.label} {name} "
+                  f"({round(self.items, 2)} {self.unit}, {self.items / elapsed:.1f} {self.unit}/秒)")
+
+    def summary(self):
+        elapsed = max(time.time() - self.start, 1e-6)
+        print(f"\n{self.label}完成: {self.done - self.failed}/{self.total} 成功, "
+              f"{round(self.items, 2)} {self.unit}, 耗时 {elapsed:.1f} 秒, "
+              f"吞吐 {self.items / elapsed:.1f} {self.unit}/秒")
+
+
+def read_species(args) -> List[str]:
+    """
+    从命令行参数和物种列表文件中读取鸟类名称（文件每行一个，# 开头为注释）
+    """
+    species = list(args.species or [])
+    if getattr(args, 'species_file', None):
+        with open(args.species_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    species.append(line)
+    # 去重并保持顺序
+    return list(dict.fromkeys(species))
+
+
+def read_recordings(path: str) -> List[Dict]:
+    """
+    读取 JSON 或 NDJSON 格式的录音数据文件
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.ndjson'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def make_scraper(args) -> XenoCantoScraper:
+    """
+    根据命令行参数创建爬虫实例
+
+    所有实例共享同一个连接池和令牌桶限速器，--rate 为所有并发线程合计的每秒请求数，
+    每个请求（分页、下载、资源预取）都经过限速器，爬虫自身不再额外等待；池大小默认等于并发数
+    """
+    concurrency = getattr(args, 'concurrency', 1)
+    transport = get_shared_transport(pool_size=args.pool_size or concurrency, connect_timeout=args.connect_timeout,
+                                     read_timeout=args.read_timeout, retries=args.retries, rate=args.rate)
+    fields = [name.strip() for name in args.fields.split(',') if name.strip()] if args.fields else None
+    return XenoCantoScraper(api_key=args.api_key, per_page=args.per_page, request_interval=0,
+                            transport=transport, fast_decode=args.fast_decode, fields=fields)
+
+
+def load_species_index(args):
+    """
+    --species-index 指定时加载（或新建）物种共现索引
+    """
+    if not getattr(args, 'species_index', None):
+        return None
+    from xeno_canto_species_index import SpeciesIndex
+    return SpeciesIndex.load(args.species_index)
+
+
+def save_species_index(args, species_index):
+    if species_index is not None:
+        species_index.save(args.species_index)
+        print(f"物种索引已保存到 {args.species_index}（{len(species_index)} 条录音）")
+
+
+def save_recordings(scraper: XenoCantoScraper, recordings: List[Dict], path_without_ext: str, fmt: str) -> str:
+    filename = f"{path_without_ext}.{fmt}"
+    if fmt == 'csv':
+        scraper.save_to_csv(recordings, filename)
+    elif fmt == 'ndjson':
+        scraper.save_to_ndjson(recordings, filename)
+    else:
+        scraper.save_to_json(recordings, filename)
+    return filename
+
+
+def parse_sizes(value: str) -> List[str]:
+    return [size.strip() for size in value.split(',') if size.strip()]
+
+
+def safe_filename(name: str) -> str:
+    return name.replace(' ', '_').replace('/', '_')
+
+
+def cmd_search(args) -> int:
+    scraper = make_scraper(args)
+    scraper.species_index = load_species_index(args)
+    recordings = []
+    for bird_name in read_species(args):
+        recordings.extend(scraper.get_all_recordings(bird_name, args.max_pages))
+    save_species_index(args, scraper.species_index)
+
+    if args.output:
+        path, ext = os.path.splitext(args.output)
+        save_recordings(scraper, recordings, path, ext.lstrip('.') if ext.lstrip('.') in OUTPUT_FORMATS else args.format)
+    else:
+        for rec in recordings:
+            print(json.dumps(scraper.extract_recording_info(rec), ensure_ascii=False))
+    return 0
+
+
+def cmd_harvest(args) -> int:
+    species = read_species(args)
+    if not species:
+        print("没有指定物种")
+        return 1
+
+    if args.cache_dir:
+        from xeno_canto_assets import OSCI_SIZES, SONO_SIZES
+        unknown = [size for size in parse_sizes(args.sono_sizes) if size not in SONO_SIZES]
+        unknown += [size for size in parse_sizes(args.osci_sizes) if size not in OSCI_SIZES]
+        if unknown:
+            print(f"不支持的图片尺寸: {', '.join(unknown)}")
+            return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    progress = Progress(len(species), "采集", "条录音")
+    writer = None
+    if args.compression:
+        from xeno_canto_output import ShardedWriter
+        writer = ShardedWriter(args.output_dir, compression=args.compression,
+                               max_shard_bytes=args.max_shard_mb * 1024 * 1024, workers=args.concurrency)
+    local = threading.local()
+    summary = {}
+    # 各线程的爬虫共享去重状态，重叠物种返回的同一条录音只解析一次
+    shared = XenoCantoScraper()
+    species_index = load_species_index(args)
+    # 采集期间只记录每条录音的图片地址（按录音ID去重），采集结束后由一个预取器统一下载并保存一次索引
+    assets = {}
+    assets_lock = threading.Lock()
+
+    def harvest_one(bird_name: str):
+        # 每个线程使用独立的爬虫实例，HTTP连接池和去重状态在线程间共享
+        if not hasattr(local, 'scraper'):
+            local.scraper = make_scraper(args)
+            local.scraper.coalescer = shared.coalescer
+            local.scraper.interner = shared.interner
+            local.scraper.species_index = species_index
+        recordings = local.scraper.get_all_recordings(bird_name, args.max_pages)
+        if recordings and writer:
+            writer.write_species(bird_name, [local.scraper.extract_recording_info(rec) for rec in recordings])
+        elif recordings:
+            save_recordings(local.scraper, recordings,
+                            os.path.join(args.output_dir, safe_filename(bird_name)), args.format)
+        if recordings and args.cache_dir:
+            with assets_lock:
+                for rec in recordings:
+                    if rec.get('id'):
+                        assets[str(rec['id'])] = {'id': rec['id'], 'sono': rec.get('sono'), 'osci': rec.get('osci')}
+        return len(recordings)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(harvest_one, name): name for name in species}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                count = future.result()
+                summary[name] = count
+                progress.update(count > 0, count, name)
+            except Exception as e:
+                print(f"采集 '{name}' 失败: {e}")
+                progress.update(False, 0, name)
+
+    if writer:
+        writer.close()
+    save_species_index(args, species_index)
+
+    if assets:
+        from xeno_canto_assets import AssetCache, AssetPrefetcher
+        prefetcher = AssetPrefetcher(AssetCache(args.cache_dir), get_shared_transport().session,
+                                     max_workers=args.concurrency)
+        prefetcher.prefetch(list(assets.values()), parse_sizes(args.sono_sizes), parse_sizes(args.osci_sizes))
+
+    with open(os.path.join(args.output_dir, "summary.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    progress.summary()
+    get_shared_transport().print_stats()
+    stats = shared.dedup_stats()
+    print(f"去重: {stats['unique_recordings']} 条不同录音, {stats['duplicate_recordings']} 条重复录音已复用")
+    return 0 if progress.failed == 0 else 2
+
+
+def cmd_download(args) -> int:
+    recordings = read_recordings(args.input)
+    if args.max_downloads:
+        recordings = recordings[:args.max_downloads]
+
+    progress = Progress(len(recordings), "下载", "MB")
+    local = threading.local()
+
+    def download_one(recording: Dict) -> float:
+        if not hasattr(local, 'scraper'):
+            local.scraper = make_scraper(args)
+        scraper = local.scraper
+        if not scraper.download_recording(recording, args.download_dir):
+            raise RuntimeError("下载失败")
+        path = os.path.join(args.download_dir, scraper.get_recording_filename(recording))
+        return os.path.getsize(path) / 1024 / 1024
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(download_one, rec): rec for rec in recordings}
+        for future in as_completed(futures):
+            rec_id = futures[future].get('id', 'unknown')
+            try:
+                progress.update(True, future.result(), rec_id)
+            except Exception:
+                progress.update(False, 0, rec_id)
+
+    progress.summary()
+    get_shared_transport().print_stats()
+    return 0 if progress.failed == 0 else 2
+
+
+def open_queue_backend(args):
+    """
+    --queue-url 指定时连接远程队列服务，否则使用本地SQLite数据库
+    """
+    from xeno_canto_queue import HTTPQueueBackend, SQLiteQueueBackend
+    if args.queue_url:
+        return HTTPQueueBackend(args.queue_url)
+    return SQLiteQueueBackend(args.queue_db)
+
+
+def cmd_sync(args) -> int:
+    from xeno_canto_queue import HarvestWorker, WorkQueue
+
+    queue = WorkQueue(open_queue_backend(args), lease_seconds=args.lease_seconds)
+    species = read_species(args)
+    if species:
+        added = queue.add_queries(species, args.max_pages)
+        print(f"新增 {added} 个查询任务")
+
+    start = time.time()
+    before = queue.stats()['recordings']
+
+    def run_worker() -> int:
+        scraper = make_scraper(args)
+        worker = HarvestWorker(scraper, queue, download=args.download, download_dir=args.download_dir)
+        return worker.run(idle_timeout=args.idle_timeout, poll_interval=args.poll_interval)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        done = sum(executor.map(lambda _: run_worker(), range(args.concurrency)))
+
+    # 索引队列中合并后的全部录音，包括其他节点和之前的同步采集到的录音
+    species_index = load_species_index(args)
+    if species_index is not None:
+        species_index.add_many(queue.get_recordings())
+    save_species_index(args, species_index)
+
+    stats = queue.stats()
+    elapsed = max(time.time() - start, 1e-6)
+    new_recordings = stats['recordings'] - before
+    print(f"\n同步完成: {done} 个任务, 新增 {new_recordings} 条录音, "
+          f"耗时 {elapsed:.1f} 秒, 吞吐 {done / elapsed:.2f} 任务/秒")
+    print(f"队列状态: {json.dumps(stats, ensure_ascii=False)}")
+    get_shared_transport().print_stats()
+    return 0 if stats['failed'] == 0 else 2
+
+
+def cmd_export(args) -> int:
+    from xeno_canto_queue import WorkQueue
+
+    if not args.queue_url and not os.path.exists(args.queue_db):
+        print(f"任务队列不存在: {args.queue_db}")
+        return 1
+
+    queue = WorkQueue(open_queue_backend(args))
+    recordings = queue.get_recordings()
+    scraper = XenoCantoScraper()
+    path, ext = os.path.splitext(args.output)
+    fmt = ext.lstrip('.') if ext.lstrip('.') in OUTPUT_FORMATS else args.format
+    save_recordings(scraper, recordings, path, fmt)
+    print(f"共导出 {len(recordings)} 条录音")
+    return 0
+
+
+def cmd_serve_queue(args) -> int:
+    from xeno_canto_queue import QueueServer, SQLiteQueueBackend
+
+    server = QueueServer(SQLiteQueueBackend(args.queue_db), host=args.host, port=args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("任务队列服务已停止")
+    finally:
+        server.shutdown()
+    return 0
+
+
+def cmd_verify(args) -> int:
+    recordings = read_recordings(args.input)
+    scraper = XenoCantoScraper()
+    missing = []
+    empty = []
+
+    for rec in recordings:
+        if not rec.get('file'):
+            continue
+        path = os.path.join(args.download_dir, scraper.get_recording_filename(rec))
+        if not os.path.exists(path):
+            missing.append(rec.get('id'))
+        elif os.path.getsize(path) == 0:
+            empty.append(rec.get('id'))
+
+    checked = sum(1 for rec in recordings if rec.get('file'))
+    print(f"校验 {checked} 个录音文件: 缺失 {len(missing)} 个, 空文件 {len(empty)} 个")
+    if missing:
+        print(f"缺失: {', '.join(str(i) for i in missing[:20])}{' ...' if len(missing) > 20 else ''}")
+    if empty:
+        print(f"空文件: {', '.join(str(i) for i in empty[:20])}{' ...' if len(empty) > 20 else ''}")
+    return 0 if not missing and not empty else 2
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="xeno_canto_cli", description="Xeno-canto 鸟类录音采集工具")
+    parser.add_argument('--api-key', default=os.environ.get('XENO_CANTO_API_KEY'),
+                        help="API密钥（默认读取环境变量 XENO_CANTO_API_KEY，未设置时使用网页爬取）")
+    parser.add_argument('--per-page', type=int, default=None, help="API每页结果数（50-500）")
+    parser.add_argument('--rate', type=float, default=1.0, help="所有线程合计每秒请求数，0表示不限速")
+    parser.add_argument('--fast-decode', action='store_true',
+                        help="API分页直接解码为记录格式（优先使用msgspec/orjson，数值字段转为数字）")
+    parser.add_argument('--fields', help="只保留这些字段（逗号分隔，如 id,gen,sp,file,q），自动启用快速解码")
+    parser.add_argument('--pool-size', type=int, default=0, help="HTTP连接池大小，默认等于并发数")
+    parser.add_argument('--connect-timeout', type=float, default=10, help="建立连接超时（秒）")
+    parser.add_argument('--read-timeout', type=float, default=60, help="读取响应超时（秒）")
+    parser.add_argument('--retries', type=int, default=3, help="连接错误、429和5xx的重试次数")
+    parser.add_argument('--profile', metavar='DIR', help="在性能分析下运行，并将报告写入此目录")
+    parser.add_argument('--profile-sample-every', type=int, default=1,
+                        help="性能分析时热点方法每N次调用测量一次（大于1时默认关闭tracemalloc和cProfile）")
+    parser.add_argument('--profile-full', action='store_true',
+                        help="抽样时仍开启tracemalloc和cProfile（会显著拖慢运行）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_species_args(p):
+        p.add_argument('species', nargs='*', help="鸟类名称（英文名或学名）")
+        p.add_argument('--species-file', help="物种列表文件，每行一个名称")
+        p.add_argument('--max-pages', type=int, default=10, help="每个物种最大页数")
+        p.add_argument('--species-index', help="增量更新此物种共现索引文件（包含背景物种）")
+
+    def add_format_arg(p):
+        p.add_argument('--format', choices=OUTPUT_FORMATS, default='json', help="输出格式")
+
+    def add_queue_args(p):
+        p.add_argument('--queue-db', default="harvest_queue.db", help="本地任务队列数据库（须位于本地磁盘）")
+        p.add_argument('--queue-url', help="远程任务队列服务地址（serve-queue），多机采集时使用")
+
+    p = subparsers.add_parser('search', help="搜索鸟类录音")
+    add_species_args(p)
+    add_format_arg(p)
+    p.add_argument('-o', '--output', help="输出文件（扩展名决定格式），默认输出NDJSON到标准输出")
+    p.set_defaults(func=cmd_search)
+
+    p = subparsers.add_parser('harvest', help="并发批量采集物种列表")
+    add_species_args(p)
+    add_format_arg(p)
+    p.add_argument('-c', '--concurrency', type=int, default=4, help="并发物种数")
+    p.add_argument('--output-dir', default="bird_data", help="输出目录")
+    p.add_argument('--cache-dir', help="采集完成后预取声谱图/波形图到此缓存目录")
+    p.add_argument('--sono-sizes', default="med", help="预取的声谱图尺寸（逗号分隔：small,med,large,full）")
+    p.add_argument('--osci-sizes', default="med", help="预取的波形图尺寸（逗号分隔：small,med,large，空字符串表示不预取）")
+    p.add_argument('--compression', choices=('gzip', 'zstd'),
+                   help="写入压缩的NDJSON分片和 index.json（忽略 --format）")
+    p.add_argument('--max-shard-mb', type=int, default=64, help="单个分片压缩前的最大MB数")
+    p.set_defaults(func=cmd_harvest)
+
+    p = subparsers.add_parser('download', help="下载录音文件")
+    p.add_argument('input', help="录音数据文件（JSON或NDJSON）")
+    p.add_argument('-c', '--concurrency', type=int, default=4, help="并发下载数")
+    p.add_argument('--download-dir', default="recordings", help="下载目录")
+    p.add_argument('--max-downloads', type=int, default=0, help="最大下载数量，0表示不限")
+    p.set_defaults(func=cmd_download)
+
+    p = subparsers.add_parser('sync', help="通过任务队列增量同步")
+    add_species_args(p)
+    p.add_argument('-c', '--concurrency', type=int, default=4, help="本机工作线程数")
+    add_queue_args(p)
+    p.add_argument('--lease-seconds', type=float, default=300, help="任务租约时长（秒）")
+    p.add_argument('--idle-timeout', type=float, default=0,
+                   help="队列为空（没有待领取和租用中的任务）多少秒后退出")
+    p.add_argument('--poll-interval', type=float, default=1, help="没有可领取任务时的轮询间隔（秒）")
+    p.add_argument('--download', action='store_true', help="同时下载音频文件")
+    p.add_argument('--download-dir', default="recordings", help="下载目录")
+    p.set_defaults(func=cmd_sync)
+
+    p = subparsers.add_parser('export', help="导出任务队列中的录音数据")
+    add_format_arg(p)
+    add_queue_args(p)
+    p.add_argument('-o', '--output', required=True, help="输出文件（扩展名决定格式）")
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser('serve-queue', help="托管任务队列，供多台机器通过 --queue-url 访问")
+    p.add_argument('--queue-db', default="harvest_queue.db", help="任务队列数据库（须位于本地磁盘）")
+    p.add_argument('--host', default="0.0.0.0", help="监听地址（服务无身份验证，只应在可信内网中使用）")
+    p.add_argument('--port', type=int, default=8765, help="监听端口")
+    p.set_defaults(func=cmd_serve_queue)
+
+    p = subparsers.add_parser('verify', help="校验已下载的音频文件")
+    p.add_argument('input', help="录音数据文件（JSON或NDJSON）")
+    p.add_argument('--download-dir', default="recordings", help="下载目录")
+    p.set_defaults(func=cmd_verify)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.profile:
+        return args.func(args)
+
+    from xeno_canto_profile import HarvestProfiler
+    full = True if args.profile_full else None
+    with HarvestProfiler(args.profile, stage_sample_every=args.profile_sample_every,
+                         trace_memory=full, use_cprofile=full) as profiler:
+        code = args.func(args)
+    profiler.print_summary()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
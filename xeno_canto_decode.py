@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto API分页快速解码
+将API返回的页面字节直接解码为 extract_recording_info 格式的录音记录：
+优先使用 msgspec（按需字段的类型化解码，未请求的字段不会被构建），其次 orjson，最后标准库 json；
+只保留调用方请求的字段（投影），数值字段只转换一次
+
+msgspec 和 orjson 在创建 PageDecoder 时才导入，导入本模块不会增加启动耗时
+"""
+
+import importlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# (记录字段名, API字段名)，与 extract_recording_info 的输出一致
+RECORDING_FIELDS = [
+    ('id', 'id'),
+    ('gen', 'gen'),                       # 属名
+    ('sp', 'sp'),                         # 种名
+    ('ssp', 'ssp'),                       # 亚种
+    ('en', 'en'),                         # 英文名
+    ('rec', 'rec'),                       # 录音者
+    ('cnt', 'cnt'),                       # 国家
+    ('loc', 'loc'),                       # 地点
+    ('lat', 'lat'),                       # 纬度
+    ('lng', 'lng'),                       # 经度
+    ('alt', 'alt'),                       # 海拔
+    ('type', 'type'),                     # 声音类型
+    ('sex', 'sex'),                       # 性别
+    ('stage', 'stage'),                   # 生长阶段
+    ('method', 'method'),                 # 录音方法
+    ('url', 'url'),                       # 录音URL
+    ('file', 'file'),                     # 文件URL
+    ('file_name', 'file-name'),           # 文件名
+    ('sono', 'sono'),                     # 声谱图
+    ('osci', 'osci'),                     # 波形图
+    ('lic', 'lic'),                       # 许可证
+    ('q', 'q'),                           # 质量评级
+    ('length', 'length'),                 # 时长
+    ('time', 'time'),                     # 录音时间
+    ('date', 'date'),                     # 录音日期
+    ('uploaded', 'uploaded'),             # 上传日期
+    ('also', 'also'),                     # 其他物种
+    ('rmk', 'rmk'),                       # 备注
+    ('bird_seen', 'bird-seen'),           # 是否看到鸟
+    ('animal_seen', 'animal-seen'),       # 是否看到动物
+    ('playback_used', 'playback-used'),   # 是否使用回放
+    ('temp', 'temp'),                     # 温度
+    ('regnr', 'regnr'),                   # 区域编号
+    ('auto', 'auto'),                     # 自动录音
+    ('dvc', 'dvc'),                       # 设备
+    ('mic', 'mic'),                       # 麦克风
+    ('smp', 'smp'),                       # 采样率
+]
+FIELD_NAMES = [name for name, _ in RECORDING_FIELDS]
+API_NAMES = dict(RECORDING_FIELDS)
+
+# API以字符串返回的数值字段
+FLOAT_FIELDS = {'lat', 'lng'}
+INT_FIELDS = {'alt', 'smp'}
+PAGE_INT_FIELDS = ('numRecordings', 'numSpecies', 'page', 'numPages')
+
+
+class Recording(dict):
+    """
+    已按 extract_recording_info 格式解码的录音记录，extract_recording_info 会原样返回
+    """
+
+
+def _optional_import(name: str):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def available_backend() -> str:
+    """当前环境中最快的可用JSON解码器"""
+    for name in ('msgspec', 'orjson'):
+        if _optional_import(name) is not None:
+            return name
+    return 'json'
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[Union[int, float]]:
+    # 海拔等字段偶尔带小数，无法取整时保留浮点数
+    number = _to_float(value)
+    if number is None:
+        return None
+    return int(number) if number.is_integer() else number
+
+
+class PageDecoder:
+    """
+    API分页解码器
+
+    Args:
+        fields: 需要保留的字段（extract_recording_info 的字段名），默认全部；'id' 总会保留
+        convert_numeric: 是否将 lat/lng 转为浮点数、alt/smp 转为整数（空值转为None）
+        backend: 指定 'msgspec'、'orjson' 或 'json'，默认自动选择最快的可用解码器
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None, convert_numeric: bool = True,
+                 backend: Optional[str] = None):
+        if fields is None:
+            fields = FIELD_NAMES
+        unknown = [name for name in fields if name not in API_NAMES]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        self.fields = ['id'] + [name for name in FIELD_NAMES if name in set(fields) and name != 'id']
+        self.convert_numeric = convert_numeric
+
+        self.backend = backend or available_backend()
+        if self.backend not in ('msgspec', 'orjson', 'json'):
+            raise ValueError(f"不支持的解码器: {self.backend}")
+        self._module = json if self.backend == 'json' else _optional_import(self.backend)
+        if self._module is None:
+            raise ImportError(f"{self.backend} 未安装: pip install {self.backend}")
+
+        # (记录字段名, API字段名) 和 (记录字段名, 转换函数)
+        self._pairs = [(name, API_NAMES[name]) for name in self.fields]
+        self._conversions = []
+        if convert_numeric:
+            self._conversions = [(name, _to_float) for name in self.fields if name in FLOAT_FIELDS]
+            self._conversions += [(name, _to_int) for name in self.fields if name in INT_FIELDS]
+
+        if self.backend == 'msgspec':
+            self._decoder = self._build_msgspec_decoder()
+
+    def _build_msgspec_decoder(self):
+        msgspec = self._module
+        # 只声明需要的字段，其余字段在解码时直接跳过
+        struct_fields = [(name, Any, None) for name in self.fields]
+        rename = {name: API_NAMES[name] for name in self.fields}
+        record_type = msgspec.defstruct('Recording', struct_fields, rename=rename)
+        # 顶层先解码为原始字节片段，保留与json解码相同的全部顶层键；只有 recordings 按类型解码
+        self._page_decoder = msgspec.json.Decoder(Dict[str, msgspec.Raw])
+        self._value_decoder = msgspec.json.Decoder()
+        return msgspec.json.Decoder(Optional[List[record_type]])
+
+    def _convert(self, records: List[Recording]) -> List[Recording]:
+        conversions = self._conversions
+        if conversions:
+            for record in records:
+                for name, convert in conversions:
+                    value = record[name]
+                    if value is not None:
+                        record[name] = convert(value)
+        return records
+
+    def _records_from_structs(self, structs) -> List[Recording]:
+        asdict = self._module.structs.asdict
+        return self._convert([Recording(asdict(rec)) for rec in structs])
+
+    def _records_from_dicts(self, dicts) -> List[Recording]:
+        if not isinstance(dicts, list):
+            raise ValueError(f"recordings 不是列表: {type(dicts).__name__}")
+        bad = next((rec for rec in dicts if not isinstance(rec, dict)), None)
+        if bad is not None:
+            raise ValueError(f"recordings 中的录音不是JSON对象: {type(bad).__name__}")
+        pairs = self._pairs
+        return self._convert([Recording({name: rec.get(api_name) for name, api_name in pairs}) for rec in dicts])
+
+    def decode(self, data: bytes) -> Dict:
+        """
+        解码一页API响应
+
+        Args:
+            data: 响应体字节（response.content）
+
+        Returns:
+            与 response.json() 结构相同的字典，recordings 为 Recording 列表，
+            numRecordings 等分页字段为整数
+
+        Raises:
+            ValueError: 响应体不是合法的API分页JSON，或 recordings 不是由对象组成的列表
+                （msgspec.DecodeError 和 orjson.JSONDecodeError 都是其子类）
+        """
+        if self.backend == 'msgspec':
+            raw = self._page_decoder.decode(data)
+            result = {key: self._value_decoder.decode(value) for key, value in raw.items() if key != 'recordings'}
+            recordings = raw.get('recordings')
+            result['recordings'] = self._records_from_structs(
+                (self._decoder.decode(recordings) if recordings is not None else None) or [])
+        else:
+            raw = self._module.loads(data)
+            if not isinstance(raw, dict):
+                raise ValueError(f"API响应不是JSON对象: {type(raw).__name__}")
+            result = {key: value for key, value in raw.items() if key != 'recordings'}
+            result['recordings'] = self._records_from_dicts(raw.get('recordings') or [])
+
+        for key in PAGE_INT_FIELDS:
+            if result.get(key) is not None:
+                result[key] = _to_int(result[key])
+        return result
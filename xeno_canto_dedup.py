@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 进程内去重
+合并并发的相同分页请求，复用已完成的结果，并按XC录音ID驻留录音数据，
+使重叠查询（如 "Robin"、"Turdus migratorius"、"Cardinalidae"）返回的同一条录音只解析和保存一次
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    请求合并器
+
+    同一个键的并发调用只执行一次，其余调用等待并共享结果。
+    默认不保留已完成的结果；max_records > 0 时按LRU缓存已完成的分页，
+    所有缓存分页中的录音总数不超过 max_records，供后续相同请求直接复用。
+    空结果（请求失败时爬虫返回 {}）不会被缓存，以便重试。
+    """
+
+    def __init__(self, max_records: int = 0):
+        self.max_records = max_records
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _InFlight] = {}
+        # {请求键: (结果, 录音数)}
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._cached_records = 0
+
+    @staticmethod
+    def _record_count(result) -> int:
+        if isinstance(result, dict):
+            return max(len(result.get('recordings') or ()), 1)
+        return 1
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        """
+        执行或复用键为 key 的请求
+
+        Args:
+            key: 请求键，如 ('api', 鸟类名称, 页码, 每页数量)
+            fn: 实际发起请求的函数
+
+        Returns:
+            fn 的返回值（可能来自其他线程或之前的调用）
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key][0]
+
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _InFlight()
+                self._inflight[key] = call
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and call.result and self.max_records > 0:
+                    count = self._record_count(call.result)
+                    if count <= self.max_records:
+                        self._results[key] = (call.result, count)
+                        self._cached_records += count
+                        while self._cached_records > self.max_records:
+                            _, (_, evicted) = self._results.popitem(last=False)
+                            self._cached_records -= evicted
+            call.event.set()
+
+        return call.result
+
+    def clear(self):
+        """清空已缓存的结果"""
+        with self._lock:
+            self._results.clear()
+            self._cached_records = 0
+
+
+class RecordingInterner:
+    """
+    按XC录音ID驻留录音数据
+
+    同一ID的录音只保留一个字典实例，extract_recording_info 的结果也按ID只计算一次。
+    驻留的录音按LRU最多保留 max_entries 条（0表示不限），全目录采集时内存占用有上限；
+    被淘汰的录音再次出现时会重新登记，重复计数可能偏少。
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.duplicates = 0
+        self.admitted = 0
+        self._lock = threading.Lock()
+        # {录音ID: [原始录音, 提取信息或None]}
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def intern(self, recording: Dict) -> Dict:
+        """
+        返回该录音ID对应的唯一实例，首次出现时登记传入的字典
+
+        没有ID的录音原样返回
+        """
+        rec_id = recording.get('id')
+        if not rec_id:
+            return recording
+        rec_id = str(rec_id)
+        with self._lock:
+            entry = self._entries.get(rec_id)
+            if entry is not None:
+                self._entries.move_to_end(rec_id)
+                self.duplicates += 1
+                return entry[0]
+            self._entries[rec_id] = [recording, None]
+            self.admitted += 1
+            if self.max_entries > 0:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return recording
+
+    def get(self, rec_id) -> Optional[Dict]:
+        entry = self._entries.get(str(rec_id))
+        return entry[0] if entry is not None else None
+
+    def info(self, recording: Dict, extractor: Callable[[Dict], Dict]) -> Dict:
+        """
+        返回录音的提取信息，仅对已驻留的实例按ID缓存，其他字典每次重新提取
+        """
+        rec_id = recording.get('id')
+        entry = self._entries.get(str(rec_id)) if rec_id else None
+        if entry is None or entry[0] is not recording:
+            return extractor(recording)
+
+        info = entry[1]
+        if info is None:
+            info = extractor(recording)
+            with self._lock:
+                if entry[1] is None:
+                    entry[1] = info
+                info = entry[1]
+        return info
+
+    def clear(self):
+        """清空所有驻留的录音"""
+        with self._lock:
+            self._entries.clear()
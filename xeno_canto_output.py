@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 压缩分片输出
+将录音数据写成 gzip/zstd 压缩的 NDJSON 分片，多个物种打包进同一个大小有上限的分片，
+分片按名称哈希分散到两级子目录，并用 index.json 记录每个物种所在的分片和字节区间
+
+每个物种的记录单独压缩为一个gzip成员/zstd帧，追加到当前分片末尾，
+读取某个物种时只需定位并解压它自己的区间
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+COMPRESSIONS = ('gzip', 'zstd')
+EXTENSIONS = {'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+INDEX_FILE = "index.json"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("使用zstd压缩需要安装 zstandard: pip install zstandard")
+    return zstandard
+
+
+def _compress(data: bytes, compression: str, level: Optional[int]) -> bytes:
+    if compression == 'zstd':
+        return _zstd().ZstdCompressor(level=level or 3).compress(data)
+    return gzip.compress(data, compresslevel=level or 6)
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == 'zstd':
+        return _zstd().ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def shard_dir(name: str) -> str:
+    """
+    分片名称对应的两级哈希子目录，如 "3f/a2"
+    """
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+
+class ShardedWriter:
+    """
+    压缩分片写入器
+
+    多个物种共用分片，每个分片在压缩前不超过 max_shard_bytes，超出上限的大物种会跨多个分片；
+    压缩在线程池中并行进行（zlib 和 zstd 压缩时会释放GIL）。可在多个线程中同时调用 write_species。
+
+    重复写入同一物种时旧区间不再被索引引用，只有全部区间都失效的旧分片才会在 close 时删除。
+
+    用法:
+        with ShardedWriter("bird_data", compression="gzip") as writer:
+            writer.write_species("Passer domesticus", records)
+    """
+
+    def __init__(self, output_dir: str, compression: str = 'gzip', max_shard_bytes: int = 64 * 1024 * 1024,
+                 level: Optional[int] = None, workers: int = 4):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩格式: {compression}，可选 {', '.join(COMPRESSIONS)}")
+        if compression == 'zstd':
+            _zstd()
+
+        self.output_dir = output_dir
+        self.compression = compression
+        self.max_shard_bytes = max_shard_bytes
+        self.level = level
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        self._lock = threading.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._index_path = os.path.join(output_dir, INDEX_FILE)
+        self._index = {'compression': compression, 'species': {}}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+            if self._index.get('compression') != compression:
+                raise ValueError(f"输出目录已使用 {self._index.get('compression')} 压缩，不能混用 {compression}")
+        self._old_paths = {e['path'] for shards in self._index['species'].values() for e in shards}
+
+        # 本次写入的分片名以随机前缀区分，不会追加到之前生成的分片
+        self._session = uuid.uuid4().hex[:12]
+        self._shard_count = 0
+        self._shard_file = None
+        self._shard_path = None
+        self._shard_raw = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _next_shard(self):
+        # 调用方需持有锁
+        if self._shard_file is not None:
+            self._shard_file.close()
+        name = f"{self._session}-{self._shard_count:05d}"
+        self._shard_count += 1
+        self._shard_path = os.path.join(shard_dir(name), name + EXTENSIONS[self.compression])
+        path = os.path.join(self.output_dir, self._shard_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._shard_file = open(path, 'wb')
+        self._shard_raw = 0
+
+    def _write_segment(self, entry: Dict, data: bytes):
+        compressed = _compress(data, self.compression, self.level)
+        with self._lock:
+            if self._shard_file is None or (self._shard_raw and
+                                            self._shard_raw + len(data) > self.max_shard_bytes):
+                self._next_shard()
+            # 'offset'/'bytes' 为分片内压缩区间，'raw_bytes' 为压缩前大小
+            entry['path'] = self._shard_path
+            entry['offset'] = self._shard_file.tell()
+            entry['bytes'] = len(compressed)
+            self._shard_file.write(compressed)
+            self._shard_raw += len(data)
+
+    def write_species(self, species: str, records: List[Dict]) -> int:
+        """
+        写入一个物种的全部记录，替换该物种之前的数据
+
+        Args:
+            species: 物种名称（索引键）
+            records: 可JSON序列化的记录列表
+
+        Returns:
+            该物种的区间数量（通常为1，大于 max_shard_bytes 的物种会被拆分）
+        """
+        segments = []
+        buffer = []
+        buffer_bytes = 0
+        count = 0
+
+        def flush():
+            nonlocal buffer, buffer_bytes, count
+            entry = {'records': count, 'raw_bytes': buffer_bytes}
+            future = self._executor.submit(self._write_segment, entry, b''.join(buffer))
+            segments.append(entry)
+            with self._lock:
+                self._futures.append(future)
+            buffer, buffer_bytes, count = [], 0, 0
+
+        for record in records:
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            if buffer and buffer_bytes + len(line) > self.max_shard_bytes:
+                flush()
+            buffer.append(line)
+            buffer_bytes += len(line)
+            count += 1
+        if buffer:
+            flush()
+
+        with self._lock:
+            self._index['species'][species] = segments
+        return len(segments)
+
+    def close(self):
+        """
+        等待所有区间写完，删除不再被引用的旧分片并写入索引
+        """
+        self._executor.shutdown(wait=True)
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+
+        live_paths = {e['path'] for shards in self._index['species'].values() for e in shards}
+        for relpath in self._old_paths - live_paths:
+            path = os.path.join(self.output_dir, relpath)
+            if os.path.exists(path):
+                os.remove(path)
+        self._old_paths = live_paths
+
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+        total_raw = sum(e.get('raw_bytes', 0) for shards in self._index['species'].values() for e in shards)
+        total = sum(e['bytes'] for shards in self._index['species'].values() for e in shards)
+        print(f"分片输出完成: {len(self._index['species'])} 个物种, {len(live_paths)} 个分片, "
+              f"{total_raw / 1024 / 1024:.2f} MB -> {total / 1024 / 1024:.2f} MB ({self.compression})")
+
+
+def load_index(output_dir: str) -> Dict:
+    """读取分片输出目录的索引"""
+    with open(os.path.join(output_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_species(output_dir: str, species: str) -> Iterator[Dict]:
+    """
+    逐条读取某个物种的记录
+
+    Args:
+        output_dir: 分片输出目录
+        species: 物种名称
+
+    Returns:
+        记录迭代器
+    """
+    index = load_index(output_dir)
+    for entry in index['species'].get(species, []):
+        with open(os.path.join(output_dir, entry['path']), 'rb') as f:
+            # 旧版索引没有 offset，整个分片只属于一个物种
+            if 'offset' in entry:
+                f.seek(entry['offset'])
+                data = _decompress(f.read(entry['bytes']), index['compression'])
+            else:
+                data = _decompress(f.read(), index['compression'])
+        for line in data.splitlines():
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 流式下载处理管道
+下载的数据块经有界内存队列分发给多个处理阶段（哈希、写文件、用户回调），
+队列满时下载线程阻塞（背压），音频只读取一次，处理与网络传输重叠
+
+流式阶段（HashStage、WriteStage、streaming=True 的 CallbackStage）的内存上限约为
+阶段数 × queue_size × chunk_size；非流式的 CallbackStage 会在内存中保存完整音频，
+使用进程池时还会再复制一份传给子进程，内存占用随并发下载数 × 音频大小增长
+"""
+
+import hashlib
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from xeno_canto_urls import normalize_url
+
+_END = object()
+
+
+class _Abort:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class _ChunkStream:
+    """
+    从有界队列中逐块读取数据的迭代器，记录是否已读到结束标记
+    """
+
+    def __init__(self, chunks: queue.Queue):
+        self.chunks = chunks
+        self.finished = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        while not self.finished:
+            item = self.chunks.get()
+            if item is _END:
+                self.finished = True
+                return
+            if isinstance(item, _Abort):
+                self.finished = True
+                raise item.error
+            yield item
+
+    def drain(self):
+        # 阶段提前结束时继续取空队列，避免下载线程在 put 上永久阻塞
+        while not self.finished:
+            item = self.chunks.get()
+            self.finished = item is _END or isinstance(item, _Abort)
+
+
+class Stage:
+    """
+    处理阶段基类
+
+    子类实现 consume(recording, chunks)：逐块读取 chunks 迭代器并返回该阶段的结果。
+    下载失败时迭代器会抛出异常，阶段应在此时清理自己的中间状态。
+    所有阶段都成功后管道调用 commit，否则对已成功的阶段调用 abort。
+    """
+
+    name = 'stage'
+
+    def existing(self, recording: Dict) -> Optional[str]:
+        """
+        输出已存在时返回其文件路径，管道会跳过该阶段，并从该文件读取数据交给其他阶段（不再下载）
+        """
+        return None
+
+    def consume(self, recording: Dict, chunks: Iterator[bytes]):
+        raise NotImplementedError
+
+    def commit(self, recording: Dict, result):
+        """所有阶段都成功后调用，返回值作为该阶段的最终结果"""
+        return result
+
+    def abort(self, recording: Dict, result):
+        """其他阶段或下载失败时调用，清理 consume 产生的中间结果"""
+
+
+class HashStage(Stage):
+    """计算音频内容的哈希值"""
+
+    def __init__(self, algorithm: str = 'sha256', name: Optional[str] = None):
+        self.algorithm = algorithm
+        self.name = name or algorithm
+
+    def consume(self, recording: Dict, chunks: Iterator[bytes]) -> str:
+        digest = hashlib.new(self.algorithm)
+        for chunk in chunks:
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+class WriteStage(Stage):
+    """
+    将音频写入下载目录，先写临时文件，所有阶段都成功后再改名
+    """
+
+    name = 'path'
+
+    def __init__(self, download_dir: str, filename_func: Callable[[Dict], str]):
+        self.download_dir = download_dir
+        self.filename_func = filename_func
+        os.makedirs(download_dir, exist_ok=True)
+
+    def existing(self, recording: Dict) -> Optional[str]:
+        # 与 download_recording 一致：文件已存在时不再下载
+        filepath = os.path.join(self.download_dir, self.filename_func(recording))
+        return filepath if os.path.exists(filepath) else None
+
+    def consume(self, recording: Dict, chunks: Iterator[bytes]) -> str:
+        tmp_path = os.path.join(self.download_dir, self.filename_func(recording)) + ".part"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except Exception:
+            self.abort(recording, tmp_path)
+            raise
+        return tmp_path
+
+    def commit(self, recording: Dict, tmp_path: str) -> str:
+        filepath = tmp_path[:-len(".part")]
+        os.replace(tmp_path, filepath)
+        return filepath
+
+    def abort(self, recording: Dict, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class CallbackStage(Stage):
+    """
+    用户回调阶段
+
+    streaming=True 时 fn(recording, chunks) 直接在线程中逐块消费，内存占用受队列大小限制；
+    streaming=False 时在内存中拼接完整音频后调用 fn(recording, data)，
+    若提供了进程池则在进程池中执行（fn 需可被pickle），适合转码、特征提取等CPU密集任务。
+    非流式模式下每个并发下载都会在内存中保存一份完整音频（使用进程池时另有一份副本）。
+    """
+
+    def __init__(self, fn: Callable, name: Optional[str] = None, streaming: bool = False,
+                 process_pool: Optional[ProcessPoolExecutor] = None):
+        self.fn = fn
+        self.name = name or getattr(fn, '__name__', 'callback')
+        self.streaming = streaming
+        self.process_pool = process_pool
+
+    def consume(self, recording: Dict, chunks: Iterator[bytes]):
+        if self.streaming:
+            return self.fn(recording, chunks)
+        data = b''.join(chunks)
+        if self.process_pool is not None:
+            return self.process_pool.submit(self.fn, recording, data).result()
+        return self.fn(recording, data)
+
+
+class DownloadPipeline:
+    """
+    流式下载管道
+
+    用法:
+        pipeline = DownloadPipeline(scraper.session, [
+            WriteStage("recordings", scraper.get_recording_filename),
+            HashStage("sha256"),
+            CallbackStage(extract_features, process_pool=pool),
+        ])
+        results = pipeline.run(recordings)
+    """
+
+    def __init__(self, session: requests.Session, stages: List[Stage], max_workers: int = 4,
+                 queue_size: int = 16, chunk_size: int = 64 * 1024, timeout: Optional[float] = None):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"处理阶段名称重复: {names}")
+
+        self.session = session
+        self.stages = stages
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def _run_stage(self, stage: Stage, recording: Dict, chunks: queue.Queue):
+        stream = _ChunkStream(chunks)
+        try:
+            return stage.consume(recording, iter(stream))
+        finally:
+            stream.drain()
+
+    def _download_chunks(self, file_url: str) -> Iterator[bytes]:
+        # timeout 为None时使用会话（Transport）自己的连接/读取超时
+        response = self.session.get(normalize_url(file_url), stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
+    def _file_chunks(self, path: str) -> Iterator[bytes]:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def process(self, recording: Dict, stage_executor: ThreadPoolExecutor) -> Dict:
+        """
+        下载一条录音并流经所有处理阶段
+
+        输出已存在的阶段（如已下载的文件）会被跳过，其余阶段从本地文件读取数据，不再重复下载
+
+        Returns:
+            {'id': 录音ID, 'ok': 是否成功, 'bytes': 处理字节数, 'local': 是否读取的本地文件,
+             'results': {阶段名: 结果}, 'error': 错误信息}
+        """
+        result = {'id': recording.get('id'), 'ok': False, 'bytes': 0, 'local': False, 'results': {}, 'error': None}
+        file_url = recording.get('file')
+        if not file_url:
+            result['error'] = "没有文件URL"
+            return result
+
+        existing = {}
+        for stage in self.stages:
+            path = stage.existing(recording)
+            if path is not None:
+                existing[stage.name] = path
+        result['results'].update(existing)
+        stages = [stage for stage in self.stages if stage.name not in existing]
+        if not stages:
+            result['ok'] = True
+            result['local'] = True
+            return result
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        futures = [
+            stage_executor.submit(self._run_stage, stage, recording, q)
+            for stage, q in zip(stages, queues)
+        ]
+
+        local_path = next(iter(existing.values()), None)
+        result['local'] = local_path is not None
+        chunks = self._file_chunks(local_path) if local_path else self._download_chunks(file_url)
+        try:
+            for chunk in chunks:
+                result['bytes'] += len(chunk)
+                for q in queues:
+                    q.put(chunk)
+            for q in queues:
+                q.put(_END)
+        except Exception as e:
+            result['error'] = f"{'读取本地文件' if local_path else '下载'}失败: {e}"
+            for q in queues:
+                q.put(_Abort(e))
+        finally:
+            # 立即关闭HTTP响应或本地文件
+            chunks.close()
+
+        succeeded = []
+        for stage, future in zip(stages, futures):
+            try:
+                succeeded.append((stage, future.result()))
+            except Exception as e:
+                result['error'] = result['error'] or f"{stage.name} 处理失败: {e}"
+
+        # 只有所有阶段都成功时才提交（如将临时文件改名为正式文件）
+        for stage, stage_result in succeeded:
+            try:
+                if result['error'] is None:
+                    result['results'][stage.name] = stage.commit(recording, stage_result)
+                else:
+                    stage.abort(recording, stage_result)
+            except Exception as e:
+                result['error'] = result['error'] or f"{stage.name} 提交失败: {e}"
+
+        result['ok'] = result['error'] is None
+        return result
+
+    def run(self, recordings: List[Dict]) -> List[Dict]:
+        """
+        并发下载并处理一批录音
+
+        Returns:
+            与输入顺序一致的处理结果列表
+        """
+        if not recordings:
+            print("没有录音数据需要处理")
+            return []
+
+        print(f"管道处理 {len(recordings)} 个录音 ({self.max_workers} 个下载线程, {len(self.stages)} 个处理阶段)...")
+        start = time.time()
+
+        # 每个下载线程的每个阶段都需要一个消费线程，否则生产者会在满队列上死锁
+        with ThreadPoolExecutor(max_workers=self.max_workers * len(self.stages)) as stage_executor, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as download_executor:
+            results = list(download_executor.map(lambda rec: self.process(rec, stage_executor), recordings))
+
+        elapsed = max(time.time() - start, 1e-6)
+        success = sum(1 for r in results if r['ok'])
+        total_mb = sum(r['bytes'] for r in results if not r['local']) / 1024 / 1024
+        local = sum(1 for r in results if r['local'])
+        print(f"管道处理完成！成功 {success}/{len(results)} 个（{local} 个使用已下载的文件）, "
+              f"下载 {total_mb:.2f} MB, {total_mb / elapsed:.2f} MB/秒")
+        for r in results:
+            if r['error']:
+                print(f"  录音 {r['id']}: {r['error']}")
+        return results
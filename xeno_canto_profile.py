@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 采集性能分析
+在 cProfile、tracemalloc 和栈采样下运行任意采集任务，把耗时和内存分配归到各个热点阶段
+（search_bird_web、_parse_recording_row、extract_recording_info、save_to_csv、save_to_json），
+并输出火焰图兼容的折叠栈文件
+
+输出目录内容:
+    stages.json      各阶段调用次数、耗时和内存分配
+    cprofile.pstats  cProfile 原始数据，包含分析期间启动的工作线程（可用 snakeviz、pstats 查看）
+    stacks.folded    采样得到的折叠栈（可用 flamegraph.pl、speedscope 生成火焰图）
+    memory_top.txt   tracemalloc 按代码行统计的内存分配排行
+"""
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+from xeno_canto_scraper import XenoCantoScraper
+
+# (类所在模块, 类名, 方法名, 阶段名)
+HOT_PATHS = [
+    ('xeno_canto_scraper', 'XenoCantoScraper', 'search_bird_web', 'search_bird_web'),
+    ('xeno_canto_scraper', 'XenoCantoScraper', 'extract_recording_info', 'extract_recording_info'),
+    ('xeno_canto_scraper', 'XenoCantoScraper', 'save_to_csv', 'save_to_csv'),
+    ('xeno_canto_scraper', 'XenoCantoScraper', 'save_to_json', 'save_to_json'),
+    # 网页解析在 WebSearchBackend 中完成，XenoCantoScraper._parse_recording_row 只是转发
+    ('xeno_canto_web', 'WebSearchBackend', 'parse_recording_row', '_parse_recording_row'),
+]
+
+
+class _StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.sampled = 0
+        self.seconds = 0.0
+        self.alloc_bytes = 0
+
+
+class HarvestProfiler:
+    """
+    采集性能分析器
+
+    对热点方法按 stage_sample_every 每N次调用测量一次耗时和内存分配峰值，
+    同时以 sample_interval 秒的间隔对所有线程进行栈采样。
+
+    内存分配按 tracemalloc 的峰值统计（调用期间相对调用前的最高增量，含嵌套阶段）。
+    tracemalloc 的峰值是进程级的，多线程同时执行时各阶段的峰值为近似值。
+
+    tracemalloc 和 cProfile 对所有调用生效，会显著拖慢被测代码，抽样（stage_sample_every > 1）
+    无法降低这部分开销；因此 trace_memory/use_cprofile 默认只在 stage_sample_every == 1 时开启，
+    抽样模式下只测量各阶段耗时和栈采样。tracemalloc 默认只记录1层调用栈（trace_frames）。
+
+    Python 3.11 及以下的 cProfile 只记录调用 enable 的线程，因此分析期间新启动的线程
+    会各自创建一个 cProfile，在 stop 时合并；start 之前已在运行的线程不会被 cProfile 记录
+    （栈采样仍然覆盖）。Python 3.12 起单个 cProfile 即覆盖所有线程。
+
+    用法:
+        with HarvestProfiler("profile_report") as profiler:
+            scraper.batch_search(["Passer domesticus"])
+        profiler.print_summary()
+    """
+
+    def __init__(self, output_dir: str = "profile_report", sample_interval: float = 0.005,
+                 stage_sample_every: int = 1, trace_memory: Optional[bool] = None,
+                 use_cprofile: Optional[bool] = None, trace_frames: int = 1):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.stage_sample_every = max(stage_sample_every, 1)
+        full = self.stage_sample_every == 1
+        self.trace_memory = full if trace_memory is None else trace_memory
+        self.use_cprofile = full if use_cprofile is None else use_cprofile
+        self.trace_frames = max(trace_frames, 1)
+        self._started_tracing = False
+        # 每个线程正在测量的阶段栈：[调用前内存, 子阶段观测到的最高峰值]
+        self._frames = threading.local()
+
+        self.stages: Dict[str, _StageStats] = {}
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._patched = []
+        self._profiler: Optional[cProfile.Profile] = None
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_time = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _wrap(self, func, stage: str):
+        stats = self.stages.setdefault(stage, _StageStats())
+        profiler = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler._lock:
+                stats.calls += 1
+                # 第一次调用总会被测量，低频阶段（如 save_to_csv）不会漏掉
+                measure = (stats.calls - 1) % profiler.stage_sample_every == 0
+            if not measure:
+                return func(*args, **kwargs)
+
+            tracing = tracemalloc.is_tracing()
+            frame = None
+            if tracing:
+                stack = profiler._frame_stack()
+                if stack:
+                    # reset_peak 会清掉外层阶段已达到的峰值，先记到外层的帧上
+                    stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+                frame = [tracemalloc.get_traced_memory()[0], 0]
+                stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                alloc = 0
+                if frame is not None:
+                    stack.pop()
+                    peak = max(tracemalloc.get_traced_memory()[1], frame[1])
+                    alloc = max(peak - frame[0], 0)
+                    if stack:
+                        stack[-1][1] = max(stack[-1][1], peak)
+                with profiler._lock:
+                    stats.sampled += 1
+                    stats.seconds += seconds
+                    stats.alloc_bytes += alloc
+
+        return wrapper
+
+    def _frame_stack(self) -> List[list]:
+        stack = getattr(self._frames, 'stack', None)
+        if stack is None:
+            stack = self._frames.stack = []
+        return stack
+
+    def _patch(self):
+        for module_name, class_name, method_name, stage in HOT_PATHS:
+            try:
+                module = __import__(module_name)
+            except ImportError as e:
+                print(f"跳过阶段 {stage}: {e}")
+                continue
+            cls = getattr(module, class_name)
+            original = cls.__dict__[method_name]
+            setattr(cls, method_name, self._wrap(original, stage))
+            self._patched.append((cls, method_name, original))
+
+    def _unpatch(self):
+        for cls, method_name, original in reversed(self._patched):
+            setattr(cls, method_name, original)
+        self._patched = []
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def _profile_thread(self, frame, event, arg):
+        # 由 threading.setprofile 在新线程的第一个事件时调用，enable 后替换为该线程自己的 cProfile
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._thread_profilers.append(profiler)
+        profiler.enable()
+
+    def start(self):
+        """开始分析"""
+        self._patch()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._started_tracing = True
+        if self.use_cprofile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            if sys.version_info < (3, 12):
+                threading.setprofile(self._profile_thread)
+        if self.sample_interval > 0:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        """停止分析并写出报告"""
+        self.elapsed = time.perf_counter() - self._start_time
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self._profiler is not None:
+            self._profiler.disable()
+            threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot() if self.trace_memory and tracemalloc.is_tracing() else None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._unpatch()
+        self.write_report(snapshot)
+
+    def stage_report(self) -> Dict[str, Dict]:
+        """
+        各阶段统计，耗时和分配量按采样比例折算为估计总量；
+        est_alloc_bytes 为各次调用内存分配峰值之和的估计，未开启 tracemalloc 时为0
+
+        Returns:
+            {阶段名: {'calls', 'sampled_calls', 'est_seconds', 'avg_ms', 'est_alloc_bytes', 'share'}}
+        """
+        report = {}
+        for stage, stats in self.stages.items():
+            scale = stats.calls / stats.sampled if stats.sampled else 0
+            est_seconds = stats.seconds * scale
+            report[stage] = {
+                'calls': stats.calls,
+                'sampled_calls': stats.sampled,
+                'est_seconds': round(est_seconds, 6),
+                'avg_ms': round(stats.seconds / stats.sampled * 1000, 4) if stats.sampled else 0,
+                'est_alloc_bytes': int(stats.alloc_bytes * scale),
+                # 阶段可能嵌套（如 save_to_csv 内调用 extract_recording_info），占比为含子调用的比例；
+                # 多线程采集时各线程耗时累加，占比可能超过100%
+                'share': round(est_seconds / self.elapsed, 4) if self.elapsed else 0
+            }
+        return report
+
+    def _merged_stats(self) -> pstats.Stats:
+        """主线程和各工作线程的 cProfile 数据合并后的统计"""
+        merged = None
+        for profiler in [self._profiler] + self._thread_profilers:
+            try:
+                stats = pstats.Stats(profiler)
+            except TypeError:
+                # 没有记录到任何调用的线程
+                continue
+            if merged is None:
+                merged = stats
+            else:
+                merged.add(stats)
+        self._thread_profilers = []
+        return merged if merged is not None else pstats.Stats()
+
+    def write_report(self, snapshot=None):
+        """将各项分析结果写入输出目录"""
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        with open(os.path.join(self.output_dir, "stages.json"), 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_seconds': round(self.elapsed, 6), 'stages': self.stage_report()},
+                      f, ensure_ascii=False, indent=2)
+
+        if self._profiler is not None:
+            self._merged_stats().dump_stats(os.path.join(self.output_dir, "cprofile.pstats"))
+
+        with open(os.path.join(self.output_dir, "stacks.folded"), 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        if snapshot is not None:
+            with open(os.path.join(self.output_dir, "memory_top.txt"), 'w', encoding='utf-8') as f:
+                for stat in snapshot.statistics('lineno')[:50]:
+                    f.write(f"{stat}\n")
+
+        print(f"性能分析报告已保存到 {self.output_dir}")
+
+    def print_summary(self):
+        """打印各阶段耗时和内存分配摘要"""
+        print(f"\n总耗时 {self.elapsed:.3f} 秒, 栈采样 {sum(self.stacks.values())} 次")
+        print(f"{'阶段':<26}{'调用':>8}{'估计耗时(s)':>14}{'平均(ms)':>12}{'分配峰值(KB)':>12}{'占比':>8}")
+        for stage, r in sorted(self.stage_report().items(), key=lambda item: -item[1]['est_seconds']):
+            print(f"{stage:<26}{r['calls']:>8}{r['est_seconds']:>14.4f}{r['avg_ms']:>12.4f}"
+                  f"{r['est_alloc_bytes'] / 1024:>12.1f}{r['share'] * 100:>7.1f}%")
+
+
+def profile_harvest(bird_names: List[str], api_key: Optional[str] = None, output_dir: str = "profile_report",
+                    data_dir: str = "bird_data", **profiler_options) -> Dict[str, Dict]:
+    """
+    在性能分析下运行一次 batch_search
+
+    Args:
+        bird_names: 鸟类名称列表
+        api_key: API密钥，为空时使用网页爬取方式
+        output_dir: 报告输出目录
+        data_dir: 采集数据输出目录
+        profiler_options: 传给 HarvestProfiler 的其他参数
+
+    Returns:
+        各阶段统计
+    """
+    scraper = XenoCantoScraper(api_key=api_key)
+    with HarvestProfiler(output_dir, **profiler_options) as profiler:
+        scraper.batch_search(bird_names, output_dir=data_dir)
+    profiler.print_summary()
+    return profiler.stage_report()
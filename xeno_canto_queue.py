@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 分布式采集任务队列
+基于租约（lease）的查询/下载任务队列，多台机器上的工作进程领取分片、定期续租并释放，
+过期租约会被自动回收，采集结果按XC录音ID幂等合并
+
+SQLiteQueueBackend 只适用于单台机器（数据库须位于本地磁盘）；多机采集时在一台机器上运行
+QueueServer 托管数据库，其他机器通过 HTTPQueueBackend 访问
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import requests
+
+# 任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# 任务类型
+QUERY = 'query'
+DOWNLOAD = 'download'
+
+
+class QueueBackend:
+    """
+    任务队列存储后端接口
+
+    实现以下方法即可接入其他存储（如Redis、PostgreSQL）。
+    SQLiteQueueBackend 适用于同一台机器上的多进程，HTTPQueueBackend 通过 QueueServer 供多台机器共享。
+    """
+
+    def enqueue(self, task_key: str, kind: str, payload: Dict, max_attempts: int) -> bool:
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, limit: int, lease_seconds: float) -> List[Dict]:
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id: str, task_keys: List[str], lease_seconds: float) -> int:
+        raise NotImplementedError
+
+    def complete(self, worker_id: str, task_key: str) -> bool:
+        raise NotImplementedError
+
+    def release(self, worker_id: str, task_key: str, error: Optional[str] = None) -> bool:
+        raise NotImplementedError
+
+    def reclaim_expired(self) -> int:
+        raise NotImplementedError
+
+    def merge_recordings(self, recordings: List[Dict]) -> int:
+        raise NotImplementedError
+
+    def get_recordings(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    基于SQLite的任务队列后端
+
+    每个线程使用独立连接，领取任务时使用 BEGIN IMMEDIATE 加写锁，
+    保证同一任务不会被两个工作进程同时领取。
+
+    数据库使用WAL模式，只能放在本地磁盘上：SQLite的WAL和文件锁在NFS/SMB等网络文件系统上不可靠，
+    多台机器共享同一个数据库文件可能导致任务被重复领取甚至数据库损坏，多机采集请使用 QueueServer。
+    """
+
+    def __init__(self, db_path: str = "harvest_queue.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                error TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires);
+            CREATE TABLE IF NOT EXISTS recordings (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+        """)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, task_key: str, kind: str, payload: Dict, max_attempts: int = 3) -> bool:
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO tasks (task_key, kind, payload, status, max_attempts, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (task_key, kind, json.dumps(payload, ensure_ascii=False), PENDING, max_attempts, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def claim(self, worker_id: str, limit: int = 1, lease_seconds: float = 300) -> List[Dict]:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 先在同一事务内回收过期租约，再领取待处理任务
+            self._reclaim(conn, now)
+            rows = conn.execute(
+                "SELECT task_key, kind, payload, attempts FROM tasks "
+                "WHERE status = ? ORDER BY updated LIMIT ?",
+                (PENDING, limit)
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+                    "WHERE task_key = ?",
+                    (LEASED, worker_id, now + lease_seconds, now, row['task_key'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return [
+            {
+                'task_key': row['task_key'],
+                'kind': row['kind'],
+                'payload': json.loads(row['payload']),
+                'attempts': row['attempts'] + 1
+            }
+            for row in rows
+        ]
+
+    def heartbeat(self, worker_id: str, task_keys: List[str], lease_seconds: float = 300) -> int:
+        if not task_keys:
+            return 0
+        now = time.time()
+        placeholders = ','.join('?' * len(task_keys))
+        cursor = self._conn().execute(
+            f"UPDATE tasks SET lease_expires = ?, updated = ? "
+            f"WHERE owner = ? AND status = ? AND task_key IN ({placeholders})",
+            (now + lease_seconds, now, worker_id, LEASED, *task_keys)
+        )
+        return cursor.rowcount
+
+    def complete(self, worker_id: str, task_key: str) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE tasks SET status = ?, lease_expires = NULL, error = NULL, updated = ? "
+            "WHERE task_key = ? AND owner = ? AND status = ?",
+            (DONE, time.time(), task_key, worker_id, LEASED)
+        )
+        return cursor.rowcount > 0
+
+    def release(self, worker_id: str, task_key: str, error: Optional[str] = None) -> bool:
+        # 失败且超过最大尝试次数的任务标记为失败，否则放回待领取状态；
+        # 主动释放（无错误）不计入尝试次数
+        cursor = self._conn().execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts AND ? IS NOT NULL THEN ? ELSE ? END, "
+            "attempts = attempts - CASE WHEN ? IS NULL THEN 1 ELSE 0 END, "
+            "owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+            "WHERE task_key = ? AND owner = ? AND status = ?",
+            (error, FAILED, PENDING, error, error, time.time(), task_key, worker_id, LEASED)
+        )
+        return cursor.rowcount > 0
+
+    def _reclaim(self, conn: sqlite3.Connection, now: float) -> int:
+        cursor = conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, "
+            "owner = NULL, lease_expires = NULL, error = 'lease expired', updated = ? "
+            "WHERE status = ? AND lease_expires < ?",
+            (FAILED, PENDING, now, LEASED, now)
+        )
+        return cursor.rowcount
+
+    def reclaim_expired(self) -> int:
+        return self._reclaim(self._conn(), time.time())
+
+    def merge_recordings(self, recordings: List[Dict]) -> int:
+        conn = self._conn()
+        now = time.time()
+        rows = [
+            (str(rec['id']), json.dumps(rec, ensure_ascii=False), now)
+            for rec in recordings if rec.get('id')
+        ]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO recordings (id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def get_recordings(self) -> List[Dict]:
+        rows = self._conn().execute("SELECT data FROM recordings ORDER BY CAST(id AS INTEGER)").fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+        result = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        result.update({row['status']: row['n'] for row in rows})
+        result['recordings'] = self._conn().execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+        return result
+
+
+# QueueServer 对外提供的后端方法
+REMOTE_METHODS = ('enqueue', 'claim', 'heartbeat', 'complete', 'release', 'reclaim_expired',
+                  'merge_recordings', 'get_recordings', 'stats')
+
+
+class HTTPQueueBackend(QueueBackend):
+    """
+    通过HTTP访问 QueueServer 的任务队列后端，供多台机器上的工作进程共享同一个队列
+
+    Args:
+        base_url: QueueServer 地址，如 http://10.0.0.5:8765
+        session: 可选的HTTP会话
+        timeout: 请求超时（秒）
+    """
+
+    def __init__(self, base_url: str, session: Optional[requests.Session] = None, timeout: float = 60):
+        self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def _call(self, method: str, **kwargs):
+        response = self.session.post(f"{self.base_url}/{method}", json=kwargs, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['result']
+
+    def enqueue(self, task_key: str, kind: str, payload: Dict, max_attempts: int = 3) -> bool:
+        return self._call('enqueue', task_key=task_key, kind=kind, payload=payload, max_attempts=max_attempts)
+
+    def claim(self, worker_id: str, limit: int = 1, lease_seconds: float = 300) -> List[Dict]:
+        return self._call('claim', worker_id=worker_id, limit=limit, lease_seconds=lease_seconds)
+
+    def heartbeat(self, worker_id: str, task_keys: List[str], lease_seconds: float = 300) -> int:
+        return self._call('heartbeat', worker_id=worker_id, task_keys=task_keys, lease_seconds=lease_seconds)
+
+    def complete(self, worker_id: str, task_key: str) -> bool:
+        return self._call('complete', worker_id=worker_id, task_key=task_key)
+
+    def release(self, worker_id: str, task_key: str, error: Optional[str] = None) -> bool:
+        return self._call('release', worker_id=worker_id, task_key=task_key, error=error)
+
+    def reclaim_expired(self) -> int:
+        return self._call('reclaim_expired')
+
+    def merge_recordings(self, recordings: List[Dict]) -> int:
+        return self._call('merge_recordings', recordings=recordings)
+
+    def get_recordings(self) -> List[Dict]:
+        return self._call('get_recordings')
+
+    def stats(self) -> Dict[str, int]:
+        return self._call('stats')
+
+
+class QueueServer:
+    """
+    在一台机器上托管任务队列后端，通过HTTP（POST /<方法名>，JSON参数）供其他机器访问
+
+    领取、续租和释放都在服务端的同一个后端上执行，租约语义与本地使用时相同。
+    服务没有身份验证，只应监听在可信的内网中。
+
+    用法:
+        server = QueueServer(SQLiteQueueBackend("harvest_queue.db"), host="0.0.0.0", port=8765)
+        server.serve_forever()
+    """
+
+    def __init__(self, backend: QueueBackend, host: str = "127.0.0.1", port: int = 8765):
+        self.backend = backend
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        backend = self.backend
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: Dict):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                method = self.path.strip('/')
+                if method not in REMOTE_METHODS:
+                    self._reply(404, {'error': f"未知方法: {method}"})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    kwargs = json.loads(self.rfile.read(length) or b'{}')
+                    result = getattr(backend, method)(**kwargs)
+                except Exception as e:
+                    self._reply(500, {'error': str(e)})
+                    return
+                self._reply(200, {'result': result})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        print(f"任务队列服务已启动: {self.address}")
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class WorkQueue:
+    """
+    采集任务队列
+
+    查询任务以 (鸟类名称, 页码) 为分片，下载任务以录音ID为分片，
+    任务键唯一，重复入队不会产生重复请求。
+    """
+
+    def __init__(self, backend: Optional[QueueBackend] = None, lease_seconds: float = 300, max_attempts: int = 3):
+        self.backend = backend or SQLiteQueueBackend()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def add_queries(self, bird_names: List[str], max_pages: int = 10) -> int:
+        """
+        为每个鸟类添加第一页查询任务，后续页在第一页完成后按实际页数入队
+
+        Returns:
+            新入队的任务数量
+        """
+        count = 0
+        for bird_name in bird_names:
+            if self.add_query_page(bird_name, 1, max_pages):
+                count += 1
+        return count
+
+    def add_query_page(self, bird_name: str, page: int, max_pages: int = 10) -> bool:
+        payload = {'bird_name': bird_name, 'page': page, 'max_pages': max_pages}
+        return self.backend.enqueue(f"{QUERY}:{bird_name}:{page}", QUERY, payload, self.max_attempts)
+
+    def add_downloads(self, recordings: List[Dict], download_dir: str = "recordings") -> int:
+        """
+        为录音添加下载任务
+
+        Returns:
+            新入队的任务数量
+        """
+        count = 0
+        for recording in recordings:
+            if not recording.get('id'):
+                continue
+            payload = {'recording': recording, 'download_dir': download_dir}
+            if self.backend.enqueue(f"{DOWNLOAD}:{recording['id']}", DOWNLOAD, payload, self.max_attempts):
+                count += 1
+        return count
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[Dict]:
+        return self.backend.claim(worker_id, limit, self.lease_seconds)
+
+    def heartbeat(self, worker_id: str, task_keys: List[str]) -> int:
+        return self.backend.heartbeat(worker_id, task_keys, self.lease_seconds)
+
+    def complete(self, worker_id: str, task_key: str) -> bool:
+        return self.backend.complete(worker_id, task_key)
+
+    def release(self, worker_id: str, task_key: str, error: Optional[str] = None) -> bool:
+        return self.backend.release(worker_id, task_key, error)
+
+    def reclaim_expired(self) -> int:
+        return self.backend.reclaim_expired()
+
+    def merge_recordings(self, recordings: List[Dict]) -> int:
+        return self.backend.merge_recordings(recordings)
+
+    def get_recordings(self) -> List[Dict]:
+        return self.backend.get_recordings()
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats()
+
+
+class HarvestWorker:
+    """
+    采集工作进程
+
+    循环领取任务并执行，后台线程定期为持有的任务续租；
+    进程崩溃时租约到期后任务会被其他工作进程重新领取。
+    """
+
+    def __init__(self, scraper, queue: WorkQueue, worker_id: Optional[str] = None,
+                 batch_size: int = 1, download: bool = False, download_dir: str = "recordings"):
+        self.scraper = scraper
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.batch_size = batch_size
+        self.download = download
+        self.download_dir = download_dir
+
+        self.lost_count = 0
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat_loop(self):
+        interval = max(self.queue.lease_seconds / 3, 1)
+        wait = interval
+        while not self._stop.wait(wait):
+            with self._held_lock:
+                task_keys = list(self._held)
+            if not task_keys:
+                continue
+            try:
+                renewed = self.queue.heartbeat(self.worker_id, task_keys)
+            except Exception as e:
+                # 续租失败（如队列服务短暂不可用、数据库被锁）时继续重试，租约通常还有剩余时间
+                print(f"工作进程 {self.worker_id} 续租失败，将重试: {e}")
+                wait = max(interval / 3, 1)
+                continue
+            wait = interval
+            if renewed < len(task_keys):
+                print(f"工作进程 {self.worker_id} 有 {len(task_keys) - renewed} 个任务的租约已失效")
+
+    def _run_query(self, payload: Dict):
+        bird_name = payload['bird_name']
+        page = payload['page']
+        data = self.scraper.search_bird(bird_name, page)
+        if not data or 'recordings' not in data:
+            raise RuntimeError(f"'{bird_name}' 第 {page} 页查询失败")
+
+        recordings = data['recordings']
+        self.queue.merge_recordings(recordings)
+        if self.download:
+            self.queue.add_downloads(recordings, self.download_dir)
+
+        # 第一页完成后按实际总页数将剩余分片入队
+        if page == 1:
+            num_pages = min(int(data.get('numPages') or 1), payload.get('max_pages', 10))
+            for next_page in range(2, num_pages + 1):
+                self.queue.add_query_page(bird_name, next_page, payload.get('max_pages', 10))
+
+    def _run_download(self, payload: Dict):
+        if not self.scraper.download_recording(payload['recording'], payload['download_dir']):
+            raise RuntimeError(f"录音 {payload['recording'].get('id')} 下载失败")
+
+    def run(self, idle_timeout: float = 0, poll_interval: float = 5) -> int:
+        """
+        运行工作循环
+
+        Args:
+            idle_timeout: 队列为空持续多少秒后退出，0表示队列为空立即退出；
+                          仍有任务被租用时不会退出，因为这些任务完成后可能入队后续分页，或因失败被放回
+            poll_interval: 没有可领取任务时的轮询间隔（秒）
+
+        Returns:
+            成功完成的任务数量
+        """
+        heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeat_thread.start()
+
+        done_count = 0
+        idle_since = None
+        print(f"工作进程 {self.worker_id} 已启动")
+
+        try:
+            while True:
+                tasks = self.queue.claim(self.worker_id, self.batch_size)
+
+                if not tasks:
+                    stats = self.queue.stats()
+                    if stats[LEASED] or stats[PENDING]:
+                        idle_since = None
+                    else:
+                        idle_since = idle_since or time.time()
+                        if time.time() - idle_since >= idle_timeout:
+                            break
+                    time.sleep(poll_interval)
+                    continue
+                idle_since = None
+
+                with self._held_lock:
+                    self._held.update(task['task_key'] for task in tasks)
+
+                for task in tasks:
+                    try:
+                        if task['kind'] == QUERY:
+                            self._run_query(task['payload'])
+                        elif task['kind'] == DOWNLOAD:
+                            self._run_download(task['payload'])
+                        if self.queue.complete(self.worker_id, task['task_key']):
+                            done_count += 1
+                        else:
+                            # 租约已过期并被回收，任务可能已由其他工作进程重新执行
+                            self.lost_count += 1
+                            print(f"任务 {task['task_key']} 已完成但租约已失效，不计入完成数")
+                    except Exception as e:
+                        print(f"任务 {task['task_key']} 执行失败: {e}")
+                        self.queue.release(self.worker_id, task['task_key'], str(e))
+                    finally:
+                        with self._held_lock:
+                            self._held.discard(task['task_key'])
+        finally:
+            self._stop.set()
+            heartbeat_thread.join()
+
+        lost = f"，{self.lost_count} 个任务完成时租约已失效" if self.lost_count else ""
+        print(f"工作进程 {self.worker_id} 退出，共完成 {done_count} 个任务{lost}")
+        return done_count
@@ -11,26 +11,54 @@ import json
 import time
 import csv
 from typing import List, Dict, Optional
-from urllib.parse import quote, urlencode, urlparse
+from urllib.parse import urlparse
 import os
 import re
-from bs4 import BeautifulSoup
-from pathlib import Path
+from xeno_canto_urls import normalize_url
+from xeno_canto_dedup import RecordingInterner, RequestCoalescer
+from xeno_canto_transport import Transport
+from xeno_canto_decode import Recording
+
+# BeautifulSoup 只在网页爬取方式下使用，见 web_backend 属性的延迟导入
+WEB_SEARCH_URL = "https://xeno-canto.org/explore"
 
 class XenoCantoScraper:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, per_page: Optional[int] = None, request_interval: float = 1.0,
+                 dedup: bool = True, species_index=None, transport: Optional[Transport] = None,
+                 fast_decode: bool = False, fields: Optional[List[str]] = None):
+        """
+        Args:
+            api_key: API密钥，为空时使用网页爬取方式
+            per_page: API每页结果数（50-500），为空时使用API默认值
+            request_interval: 连续请求之间的间隔（秒）
+            dedup: 是否合并相同的分页请求并按录音ID驻留录音数据
+            species_index: 可选的 SpeciesIndex，采集时增量索引前景和背景（also）物种
+            transport: HTTP传输（连接池、超时、重试），可在多个爬虫实例间共享；默认新建一个
+            fast_decode: API分页是否直接解码为 extract_recording_info 格式的记录（见 xeno_canto_decode），
+                         数值字段会转换为数字
+            fields: 快速解码时只保留的字段，默认全部；指定后自动启用快速解码
+        """
         self.api_key = api_key
+        self.per_page = per_page
+        self.request_interval = request_interval
+        self.dedup = dedup
+        self.coalescer = RequestCoalescer()
+        self.interner = RecordingInterner()
+        self.species_index = species_index
+        self.decoder = None
+        if fast_decode or fields:
+            from xeno_canto_decode import PageDecoder
+            self.decoder = PageDecoder(fields)
         if api_key:
             # 使用API方式
             self.base_url = "https://xeno-canto.org/api/3/recordings"
         else:
             # 使用网页爬取方式
-            self.search_url = "https://xeno-canto.org/explore"
+            self.search_url = WEB_SEARCH_URL
+        self._web_backend = None
             
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.transport = transport or Transport()
+        self.session = self.transport.session
         
     def search_bird_api(self, bird_name: str, page: int = 1) -> Dict:
         """
@@ -54,12 +82,15 @@ class XenoCantoScraper:
             'page': page,
             'key': self.api_key
         }
+        if self.per_page:
+            params['per_page'] = self.per_page
         
         try:
             response = self.session.get(self.base_url, params=params)
             response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            return self._decode_page(response)
+        except (requests.RequestException, ValueError) as e:
+            # 快速解码器的解析错误（msgspec/orjson/json）是 ValueError，而不是 RequestException
             print(f"API请求失败: {e}")
             # 如果英文名查询失败，尝试作为属名查询
             if 'en:' in query:
@@ -67,11 +98,26 @@ class XenoCantoScraper:
                     params['query'] = f"gen:{bird_name}"
                     response = self.session.get(self.base_url, params=params)
                     response.raise_for_status()
-                    return response.json()
+                    return self._decode_page(response)
                 except:
                     pass
             return {}
     
+    def _decode_page(self, response: requests.Response) -> Dict:
+        if self.decoder is not None:
+            return self.decoder.decode(response.content)
+        return response.json()
+    
+    @property
+    def web_backend(self):
+        """
+        网页爬取后端，首次使用时才导入 xeno_canto_web（及其依赖的 BeautifulSoup）
+        """
+        if self._web_backend is None:
+            from xeno_canto_web import WebSearchBackend
+            self._web_backend = WebSearchBackend(self.session, getattr(self, 'search_url', WEB_SEARCH_URL))
+        return self._web_backend
+    
     def search_bird_web(self, bird_name: str, page: int = 1) -> Dict:
         """
         使用网页爬取方式搜索指定鸟类的录音数据
@@ -83,136 +129,61 @@ class XenoCantoScraper:
         Returns:
             包含搜索结果的字典
         """
-        params = {
-            'query': bird_name,
-            'pg': page
-        }
-        
-        try:
-            response = self.session.get(self.search_url, params=params)
-            response.raise_for_status()
-            
-            # 解析HTML页面
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 查找录音数据
-            recordings = []
-            
-            # 查找所有录音条目
-            recording_rows = soup.find_all('tr', class_='results-row')
-            
-            for row in recording_rows:
-                recording_data = self._parse_recording_row(row)
-                if recording_data:
-                    recordings.append(recording_data)
-            
-            # 获取总页数信息
-            pagination = soup.find('div', class_='pagination')
-            total_pages = 1
-            if pagination:
-                page_links = pagination.find_all('a')
-                if page_links:
-                    try:
-                        total_pages = max([int(link.text) for link in page_links if link.text.isdigit()])
-                    except:
-                        pass
-            
-            return {
-                'recordings': recordings,
-                'page': page,
-                'numPages': total_pages,
-                'numRecordings': len(recordings)
-            }
-            
-        except requests.RequestException as e:
-            print(f"网页请求失败: {e}")
-            return {}
-        except Exception as e:
-            print(f"解析失败: {e}")
-            return {}
+        return self.web_backend.search(bird_name, page)
     
     def _parse_recording_row(self, row) -> Optional[Dict]:
         """
         解析单个录音行的数据
         """
-        try:
-            data = {}
-            
-            # 获取录音ID和基本信息
-            id_cell = row.find('td', class_='results-id')
-            if id_cell:
-                id_link = id_cell.find('a')
-                if id_link and id_link.get('href'):
-                    # 从URL中提取ID
-                    href = id_link.get('href')
-                    id_match = re.search(r'/(\d+)', href)
-                    if id_match:
-                        data['id'] = id_match.group(1)
-                        data['url'] = f"https://xeno-canto.org{href}"
-            
-            # 获取物种信息
-            species_cell = row.find('td', class_='results-species')
-            if species_cell:
-                species_link = species_cell.find('a')
-                if species_link:
-                    species_text = species_link.get_text(strip=True)
-                    # 解析学名和英文名
-                    if ' - ' in species_text:
-                        scientific, english = species_text.split(' - ', 1)
-                        data['scientific_name'] = scientific.strip()
-                        data['en'] = english.strip()
-                        
-                        # 分离属名和种名
-                        if ' ' in scientific:
-                            parts = scientific.split()
-                            data['gen'] = parts[0]
-                            data['sp'] = parts[1] if len(parts) > 1 else ''
-            
-            # 获取国家信息
-            country_cell = row.find('td', class_='results-country')
-            if country_cell:
-                data['cnt'] = country_cell.get_text(strip=True)
-            
-            # 获取地点信息
-            location_cell = row.find('td', class_='results-location')
-            if location_cell:
-                data['loc'] = location_cell.get_text(strip=True)
-            
-            # 获取录音者信息
-            recordist_cell = row.find('td', class_='results-recordist')
-            if recordist_cell:
-                data['rec'] = recordist_cell.get_text(strip=True)
-            
-            # 获取日期信息
-            date_cell = row.find('td', class_='results-date')
-            if date_cell:
-                data['date'] = date_cell.get_text(strip=True)
-            
-            # 获取声音类型
-            type_cell = row.find('td', class_='results-type')
-            if type_cell:
-                data['type'] = type_cell.get_text(strip=True)
-            
-            # 获取质量评级
-            quality_cell = row.find('td', class_='results-quality')
-            if quality_cell:
-                quality_text = quality_cell.get_text(strip=True)
-                data['q'] = quality_text
-            
-            return data if data else None
-            
-        except Exception as e:
-            print(f"解析录音行失败: {e}")
-            return None
+        return self.web_backend.parse_recording_row(row)
     
     def search_bird(self, bird_name: str, page: int = 1) -> Dict:
         """
         搜索指定鸟类的录音数据（自动选择API或网页方式）
+        
+        启用去重时，并发的相同分页请求只发送一次（coalescer.max_records > 0 时已完成的分页也会复用），
+        返回的录音按ID驻留，重叠查询中的同一条录音为同一个字典实例
         """
+        if not self.dedup:
+            return self._search_bird_page(bird_name, page)
+        
+        key = ('api' if self.api_key else 'web', bird_name, page, self.per_page)
+        data = self.coalescer.do(key, lambda: self._search_bird_page(bird_name, page))
+        if not data:
+            return data
+        
+        # 返回浅拷贝，避免调用方修改共享的分页结果
+        result = dict(data)
+        if 'recordings' in result:
+            result['recordings'] = list(result['recordings'])
+        return result
+    
+    def _search_bird_page(self, bird_name: str, page: int) -> Dict:
         if self.api_key:
-            return self.search_bird_api(bird_name, page)
+            data = self.search_bird_api(bird_name, page)
         else:
-            return self.search_bird_web(bird_name, page)
+            data = self.search_bird_web(bird_name, page)
+        
+        if self.dedup and data and data.get('recordings'):
+            data['recordings'] = [self.interner.intern(rec) for rec in data['recordings']]
+        if self.species_index is not None and data and data.get('recordings'):
+            self.species_index.add_many(data['recordings'])
+        return data
+    
+    def dedup_stats(self) -> Dict[str, int]:
+        """
+        去重统计
+        
+        Returns:
+            复用的分页数、合并的并发请求数、实际请求数、登记过的录音数和重复出现的录音数
+        """
+        return {
+            'page_hits': self.coalescer.hits,
+            'page_coalesced': self.coalescer.coalesced,
+            'page_requests': self.coalescer.misses,
+            'unique_recordings': self.interner.admitted,
+            'duplicate_recordings': self.interner.duplicates
+        }
     
     def get_all_recordings(self, bird_name: str, max_pages: int = 10) -> List[Dict]:
         """
@@ -244,11 +215,11 @@ class XenoCantoScraper:
             all_recordings.extend(recordings)
             
             # 检查是否还有更多页面
-            if len(recordings) < 500:  # xeno-canto每页最多500条记录
+            if len(recordings) < (self.per_page or 500):  # xeno-canto每页最多500条记录
                 break
                 
             page += 1
-            time.sleep(1)  # 避免请求过于频繁
+            time.sleep(self.request_interval)  # 避免请求过于频繁
             
         print(f"'{bird_name}' 数据采集完成，共获取 {len(all_recordings)} 条记录")
         return all_recordings    
@@ -257,12 +228,24 @@ class XenoCantoScraper:
         """
         提取录音的关键信息
         
+        已驻留的录音按ID只提取一次，返回的字典在多次调用间共享，请勿修改
+        
+        可重复调用：已提取的记录（如从JSON文件或任务队列读回的数据）会得到相同的结果
+        
         Args:
             recording: 原始录音数据
             
         Returns:
             提取后的录音信息
         """
+        if isinstance(recording, Recording):
+            # 快速解码得到的记录已是提取后的格式
+            return recording
+        if self.dedup:
+            return self.interner.info(recording, self._build_recording_info)
+        return self._build_recording_info(recording)
+    
+    def _build_recording_info(self, recording: Dict) -> Dict:
         return {
             'id': recording.get('id'),
             'gen': recording.get('gen'),  # 属名
@@ -281,7 +264,7 @@ class XenoCantoScraper:
             'method': recording.get('method'), # 录音方法
             'url': recording.get('url'),   # 录音URL
             'file': recording.get('file'), # 文件URL
-            'file_name': recording.get('file-name'), # 文件名
+            'file_name': recording.get('file-name', recording.get('file_name')), # 文件名
             'sono': recording.get('sono'),  # 声谱图
             'osci': recording.get('osci'),  # 波形图
             'lic': recording.get('lic'),    # 许可证
@@ -292,9 +275,9 @@ class XenoCantoScraper:
             'uploaded': recording.get('uploaded'), # 上传日期
             'also': recording.get('also'),  # 其他物种
             'rmk': recording.get('rmk'),    # 备注
-            'bird_seen': recording.get('bird-seen'), # 是否看到鸟
-            'animal_seen': recording.get('animal-seen'), # 是否看到动物
-            'playback_used': recording.get('playback-used'), # 是否使用回放
+            'bird_seen': recording.get('bird-seen', recording.get('bird_seen')), # 是否看到鸟
+            'animal_seen': recording.get('animal-seen', recording.get('animal_seen')), # 是否看到动物
+            'playback_used': recording.get('playback-used', recording.get('playback_used')), # 是否使用回放
             'temp': recording.get('temp'),  # 温度
             'regnr': recording.get('regnr'), # 区域编号
             'auto': recording.get('auto'),  # 自动录音
@@ -347,33 +330,62 @@ class XenoCantoScraper:
             
         print(f"数据已保存到 {filename}")
     
-    def batch_search(self, bird_names: List[str], output_dir: str = "bird_data"):
+    def save_to_ndjson(self, recordings: List[Dict], filename: str):
+        """
+        将录音数据保存为NDJSON文件（每行一条记录）
+        
+        Args:
+            recordings: 录音数据列表
+            filename: 输出文件名
+        """
+        with open(filename, 'w', encoding='utf-8') as f:
+            for rec in recordings:
+                f.write(json.dumps(self.extract_recording_info(rec), ensure_ascii=False))
+                f.write('\n')
+            
+        print(f"数据已保存到 {filename}")
+    
+    def batch_search(self, bird_names: List[str], output_dir: str = "bird_data", compression: Optional[str] = None,
+                     max_shard_bytes: int = 64 * 1024 * 1024):
         """
         批量搜索多个鸟类的数据
         
         Args:
             bird_names: 鸟类名称列表
             output_dir: 输出目录
+            compression: 为 'gzip' 或 'zstd' 时写入压缩的NDJSON分片（见 xeno_canto_output），
+                         默认为每个鸟类分别写入CSV和JSON文件
+            max_shard_bytes: 单个分片压缩前的最大字节数
         """
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
             
         all_data = {}
+        writer = None
+        if compression:
+            from xeno_canto_output import ShardedWriter
+            writer = ShardedWriter(output_dir, compression=compression, max_shard_bytes=max_shard_bytes)
         
         for bird_name in bird_names:
             recordings = self.get_all_recordings(bird_name)
             if recordings:
                 all_data[bird_name] = recordings
                 
-                # 为每个鸟类单独保存文件
-                safe_name = bird_name.replace(' ', '_').replace('/', '_')
-                csv_filename = os.path.join(output_dir, f"{safe_name}.csv")
-                json_filename = os.path.join(output_dir, f"{safe_name}.json")
-                
-                self.save_to_csv(recordings, csv_filename)
-                self.save_to_json(recordings, json_filename)
+                if writer:
+                    writer.write_species(bird_name, [self.extract_recording_info(rec) for rec in recordings])
+                else:
+                    # 为每个鸟类单独保存文件
+                    safe_name = bird_name.replace(' ', '_').replace('/', '_')
+                    csv_filename = os.path.join(output_dir, f"{safe_name}.csv")
+                    json_filename = os.path.join(output_dir, f"{safe_name}.json")
+                    
+                    self.save_to_csv(recordings, csv_filename)
+                    self.save_to_json(recordings, json_filename)
             
-            time.sleep(2)  # 避免请求过于频繁
+            time.sleep(self.request_interval * 2)  # 避免请求过于频繁
+        
+        if writer:
+            writer.close()
         
         # 保存汇总数据
         summary_file = os.path.join(output_dir, "summary.json")
@@ -386,37 +398,30 @@ class XenoCantoScraper:
             json.dump(summary, f, ensure_ascii=False, indent=2)
             
         print(f"\n批量采集完成！共采集 {len(all_data)} 种鸟类的数据")
+        if self.dedup:
+            stats = self.dedup_stats()
+            print(f"去重: {stats['unique_recordings']} 条不同录音, "
+                  f"{stats['duplicate_recordings']} 条重复录音已复用")
         print(f"数据保存在 {output_dir} 目录中")
         
         return all_data
     
-    def download_recording(self, recording: Dict, download_dir: str = "recordings") -> bool:
+    def get_recording_filename(self, recording: Dict) -> str:
         """
-        下载单个录音文件
+        构建录音文件的本地文件名
         
         Args:
             recording: 录音数据字典
-            download_dir: 下载目录
             
         Returns:
-            下载是否成功
+            清理过非法字符的文件名，如 694038_Troglodytes_troglodytes.mp3
         """
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
-        
-        # 获取录音文件URL
-        file_url = recording.get('file')
-        if not file_url:
-            print(f"录音 {recording.get('id', 'unknown')} 没有文件URL")
-            return False
-        
-        # 构建文件名
         recording_id = recording.get('id', 'unknown')
         gen = recording.get('gen', '')
         sp = recording.get('sp', '')
         
         # 从URL获取文件扩展名
-        parsed_url = urlparse(file_url)
+        parsed_url = urlparse(recording.get('file') or '')
         file_ext = os.path.splitext(parsed_url.path)[1] or '.mp3'
         
         # 创建安全的文件名
@@ -426,7 +431,30 @@ class XenoCantoScraper:
             filename = f"{recording_id}{file_ext}"
         
         # 清理文件名中的非法字符
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
+        return re.sub(r'[<>:"/\\|?*]', '_', filename)
+    
+    def download_recording(self, recording: Dict, download_dir: str = "recordings") -> bool:
+        """
+        下载单个录音文件
+        
+        Args:
+            recording: 录音数据字典
+            download_dir: 下载目录
+            
+        Returns:
+            下载是否成功
+        """
+        if not os.path.exists(download_dir):
+            os.makedirs(download_dir, exist_ok=True)
+        
+        # 获取录音文件URL
+        file_url = recording.get('file')
+        if not file_url:
+            print(f"录音 {recording.get('id', 'unknown')} 没有文件URL")
+            return False
+        file_url = normalize_url(file_url)
+        
+        filename = self.get_recording_filename(recording)
         filepath = os.path.join(download_dir, filename)
         
         # 检查文件是否已存在
@@ -480,11 +508,34 @@ class XenoCantoScraper:
                 success_count += 1
             
             # 添加延时避免请求过于频繁
-            time.sleep(1)
+            time.sleep(self.request_interval)
         
         print(f"批量下载完成！成功下载 {success_count} 个文件")
         return success_count
     
+    def download_recordings_pipeline(self, recordings: List[Dict], download_dir: str = "recordings",
+                                     stages: Optional[List] = None, max_workers: int = 4,
+                                     queue_size: int = 16) -> List[Dict]:
+        """
+        流式下载录音，数据块经有界队列同时交给写文件、哈希和自定义处理阶段
+        
+        Args:
+            recordings: 录音数据列表
+            download_dir: 下载目录
+            stages: 额外的处理阶段（见 xeno_canto_pipeline），默认只写文件和计算SHA-256
+            max_workers: 并发下载数
+            queue_size: 每个阶段的队列长度（数据块个数）
+            
+        Returns:
+            每条录音的处理结果，如 {'id': ..., 'ok': True, 'results': {'path': ..., 'sha256': ...}}
+        """
+        from xeno_canto_pipeline import DownloadPipeline, HashStage, WriteStage
+        
+        all_stages = [WriteStage(download_dir, self.get_recording_filename), HashStage('sha256')]
+        all_stages.extend(stages or [])
+        pipeline = DownloadPipeline(self.session, all_stages, max_workers=max_workers, queue_size=queue_size)
+        return pipeline.run(recordings)
+    
     def get_recordings_with_download(self, bird_name: str, max_pages: int = 2, max_downloads: int = 5, download_dir: str = None) -> List[Dict]:
         """
         获取录音数据并下载文件
@@ -514,6 +565,30 @@ class XenoCantoScraper:
         
         return recordings
 
+    def prefetch_assets(self, recordings: List[Dict], cache_dir: str = "asset_cache",
+                        sono_sizes: tuple = ('med',), osci_sizes: tuple = ('med',),
+                        max_workers: int = 8, max_bytes: int = 512 * 1024 * 1024):
+        """
+        预取录音的声谱图和波形图到本地缓存
+        
+        Args:
+            recordings: 录音数据列表
+            cache_dir: 缓存目录
+            sono_sizes: 声谱图尺寸（small/med/large/full）
+            osci_sizes: 波形图尺寸（small/med/large）
+            max_workers: 并发下载线程数
+            max_bytes: 缓存容量上限（字节）
+            
+        Returns:
+            资源缓存，可通过 get_paths(录音ID) 查询本地路径
+        """
+        from xeno_canto_assets import AssetCache, AssetPrefetcher
+        
+        cache = AssetCache(cache_dir, max_bytes=max_bytes)
+        prefetcher = AssetPrefetcher(cache, self.session, max_workers=max_workers)
+        prefetcher.prefetch(recordings, sono_sizes, osci_sizes)
+        return cache
+
 
 def main():
     """主函数 - 测试爬虫功能"""
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 物种共现倒排索引
+记录每个物种作为前景物种（gen + sp）和背景物种（also 字段）出现的录音ID，
+支持"背景中包含某物种的录音"和物种共现次数查询，可在采集过程中增量构建
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize_species(name: str) -> str:
+    """
+    统一物种名称的大小写和空白，如 " Turdus  Viscivorus" -> "turdus viscivorus"
+    """
+    return ' '.join(name.split()).lower()
+
+
+def foreground_species(recording: Dict) -> Optional[str]:
+    """
+    录音的前景物种学名，兼容API数据（gen/sp）和网页爬取数据（scientific_name）
+    """
+    if recording.get('gen') and recording.get('sp'):
+        return f"{recording['gen']} {recording['sp']}"
+    return recording.get('scientific_name') or None
+
+
+class SpeciesIndex:
+    """
+    物种到录音ID的倒排索引
+
+    同一录音重复加入时会先移除旧的物种关系，因此可以安全地反复索引同一批数据。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._foreground: Dict[str, Set[str]] = {}
+        self._background: Dict[str, Set[str]] = {}
+        # 录音ID -> (前景物种, 背景物种元组)
+        self._recordings: Dict[str, Tuple[Optional[str], Tuple[str, ...]]] = {}
+        # 规范化名称 -> 首次出现时的原始名称，用于展示
+        self._names: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._recordings)
+
+    def _key(self, name: str) -> str:
+        key = normalize_species(name)
+        self._names.setdefault(key, ' '.join(name.split()))
+        return key
+
+    def _remove(self, rec_id: str):
+        fg, bg = self._recordings.pop(rec_id)
+        if fg:
+            self._foreground[fg].discard(rec_id)
+        for species in bg:
+            self._background[species].discard(rec_id)
+
+    def add(self, recording: Dict) -> bool:
+        """
+        索引一条录音
+
+        Returns:
+            是否已索引（没有ID的录音会被忽略）
+        """
+        rec_id = recording.get('id')
+        if not rec_id:
+            return False
+        rec_id = str(rec_id)
+
+        fg_name = foreground_species(recording)
+        also = recording.get('also') or []
+        if isinstance(also, str):
+            also = [also]
+
+        with self._lock:
+            if rec_id in self._recordings:
+                self._remove(rec_id)
+
+            fg = self._key(fg_name) if fg_name else None
+            bg = tuple(dict.fromkeys(self._key(name) for name in also if name and name.strip()))
+            if fg:
+                self._foreground.setdefault(fg, set()).add(rec_id)
+            for species in bg:
+                self._background.setdefault(species, set()).add(rec_id)
+            self._recordings[rec_id] = (fg, bg)
+        return True
+
+    def add_many(self, recordings: Iterable[Dict]) -> int:
+        """
+        批量索引录音
+
+        Returns:
+            索引的录音数量
+        """
+        return sum(1 for rec in recordings if self.add(rec))
+
+    def foreground(self, species: str) -> Set[str]:
+        """以该物种为前景物种的录音ID"""
+        with self._lock:
+            return set(self._foreground.get(normalize_species(species), ()))
+
+    def background(self, species: str) -> Set[str]:
+        """背景中包含该物种的录音ID"""
+        with self._lock:
+            return set(self._background.get(normalize_species(species), ()))
+
+    def containing(self, species: str) -> Set[str]:
+        """前景或背景中包含该物种的录音ID"""
+        key = normalize_species(species)
+        with self._lock:
+            return self._foreground.get(key, set()) | self._background.get(key, set())
+
+    def species_of(self, rec_id) -> Set[str]:
+        """某条录音中出现的全部物种（规范化名称）"""
+        fg, bg = self._recordings.get(str(rec_id), (None, ()))
+        return ({fg} if fg else set()) | set(bg)
+
+    def co_occurrence(self, species: str, top: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        与该物种出现在同一录音中的其他物种及次数
+
+        Args:
+            species: 物种学名
+            top: 只返回次数最多的前N个，默认全部
+
+        Returns:
+            [(物种名称, 共现录音数), ...]，按次数降序
+        """
+        key = normalize_species(species)
+        counts = Counter()
+        for rec_id in self.containing(species):
+            counts.update(self.species_of(rec_id) - {key})
+        return [(self._names.get(name, name), n) for name, n in counts.most_common(top)]
+
+    def pair_count(self, species_a: str, species_b: str) -> int:
+        """两个物种共同出现的录音数"""
+        return len(self.containing(species_a) & self.containing(species_b))
+
+    def save(self, filename: str):
+        """
+        保存索引为JSON文件（只保存每条录音的物种关系，倒排表在加载时重建）
+        """
+        with self._lock:
+            data = {
+                rec_id: {
+                    'fg': self._names.get(fg, fg) if fg else None,
+                    'also': [self._names.get(name, name) for name in bg]
+                }
+                for rec_id, (fg, bg) in self._recordings.items()
+            }
+        tmp_path = filename + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> 'SpeciesIndex':
+        """
+        从 save 写出的JSON文件加载索引，文件不存在时返回空索引
+        """
+        index = cls()
+        if not os.path.exists(filename):
+            return index
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for rec_id, entry in data.items():
+            index.add({'id': rec_id, 'scientific_name': entry['fg'], 'also': entry['also']})
+        return index
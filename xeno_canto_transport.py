@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto HTTP传输层
+可配置的连接池大小（与工作线程数匹配）、连接/读取超时、自动重试、gzip压缩协商、全局限速，
+并统计keep-alive连接复用情况；同一个 Transport 可在多个爬虫实例之间共享
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+# 遇到限流和服务端错误时重试
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器
+
+    Args:
+        rate: 每秒允许的请求数，0表示不限速
+        burst: 空闲后最多可连续发出的请求数
+    """
+
+    def __init__(self, rate: float = 0, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # 空闲期间最多积攒 burst 个令牌
+            start = max(self._next, now - (self.burst - 1) * self.interval)
+            self._next = start + self.interval
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TimeoutSession(requests.Session):
+    """
+    未显式指定 timeout 的请求使用默认超时，避免请求无限期挂起；
+    每个请求发出前先从限速器取得令牌
+    """
+
+    def __init__(self, timeout: Tuple[float, float], rate_limiter: Optional[RateLimiter] = None):
+        super().__init__()
+        self.default_timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.default_timeout
+        self.rate_limiter.acquire()
+        return super().request(method, url, **kwargs)
+
+
+class Transport:
+    """
+    带连接池的HTTP传输
+
+    Args:
+        pool_size: 每个主机的最大连接数，应不小于并发工作线程数
+        connect_timeout: 建立连接超时（秒）
+        read_timeout: 读取响应超时（秒）
+        retries: 连接错误、429和5xx的最大重试次数
+        backoff_factor: 重试退避系数，第n次重试前等待 backoff_factor * 2^(n-1) 秒
+        rate: 共享此传输的所有线程合计每秒请求数，0表示不限速
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 10, read_timeout: float = 60,
+                 retries: int = 3, backoff_factor: float = 1.0, rate: float = 0):
+        self.pool_size = pool_size
+        self.rate_limiter = RateLimiter(rate)
+        self.session = TimeoutSession((connect_timeout, read_timeout), self.rate_limiter)
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        retry_options = dict(total=retries, connect=retries, read=retries, status=retries,
+                             backoff_factor=backoff_factor, status_forcelist=RETRY_STATUSES,
+                             raise_on_status=False, respect_retry_after_header=True)
+        try:
+            retry = Retry(allowed_methods=frozenset(['GET', 'HEAD']), **retry_options)
+        except TypeError:
+            # urllib3 < 1.26
+            retry = Retry(method_whitelist=frozenset(['GET', 'HEAD']), **retry_options)
+
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        keep-alive连接复用统计（只包含连接池中仍保留的主机）
+
+        Returns:
+            {'requests': 请求数, 'connections': 新建连接数, 'reuse_ratio': 复用比例}
+        """
+        requests_count = 0
+        connections = 0
+        with self._lock:
+            pools = self.adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_count += pool.num_requests
+                connections += pool.num_connections
+        reuse_ratio = 1 - connections / requests_count if requests_count else 0.0
+        return {'requests': requests_count, 'connections': connections, 'reuse_ratio': round(reuse_ratio, 4)}
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"HTTP连接: {stats['requests']} 个请求, 新建 {stats['connections']} 个连接, "
+              f"复用率 {stats['reuse_ratio'] * 100:.1f}%")
+
+    def close(self):
+        self.session.close()
+
+
+_shared_transport: Optional[Transport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(**options) -> Transport:
+    """
+    获取进程内共享的 Transport，首次调用时按 options 创建，之后的 options 将被忽略
+    """
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = Transport(**options)
+        return _shared_transport
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto URL工具
+不依赖其他模块，爬虫在API模式下只需导入这里，不会加载资源缓存等模块
+"""
+
+
+def normalize_url(url: str) -> str:
+    """
+    补全API返回的协议相对URL（如 //xeno-canto.org/...）
+    """
+    if url.startswith('//'):
+        return 'https:' + url
+    return url
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xeno-canto 网页爬取后端
+解析 xeno-canto.org/explore 搜索结果页面，无需API密钥；
+依赖 BeautifulSoup，由 XenoCantoScraper.web_backend 在首次使用时导入
+"""
+
+import re
+from typing import Dict, Optional
+
+import requests
+from bs4 import BeautifulSoup
+
+
+class WebSearchBackend:
+    def __init__(self, session: requests.Session, search_url: str = "https://xeno-canto.org/explore"):
+        self.session = session
+        self.search_url = search_url
+
+    def search(self, bird_name: str, page: int = 1) -> Dict:
+        """
+        使用网页爬取方式搜索指定鸟类的录音数据
+        
+        Args:
+            bird_name: 鸟类名称（英文或学名）
+            page: 页码，默认为1
+            
+        Returns:
+            包含搜索结果的字典
+        """
+        params = {
+            'query': bird_name,
+            'pg': page
+        }
+        
+        try:
+            response = self.session.get(self.search_url, params=params)
+            response.raise_for_status()
+            
+            # 解析HTML页面
+            soup = BeautifulSoup(response.text, 'html.parser')
+            
+            # 查找录音数据
+            recordings = []
+            
+            # 查找所有录音条目
+            recording_rows = soup.find_all('tr', class_='results-row')
+            
+            for row in recording_rows:
+                recording_data = self.parse_recording_row(row)
+                if recording_data:
+                    recordings.append(recording_data)
+            
+            # 获取总页数信息
+            pagination = soup.find('div', class_='pagination')
+            total_pages = 1
+            if pagination:
+                page_links = pagination.find_all('a')
+                if page_links:
+                    try:
+                        total_pages = max([int(link.text) for link in page_links if link.text.isdigit()])
+                    except:
+                        pass
+            
+            return {
+                'recordings': recordings,
+                'page': page,
+                'numPages': total_pages,
+                'numRecordings': len(recordings)
+            }
+            
+        except requests.RequestException as e:
+            print(f"网页请求失败: {e}")
+            return {}
+        except Exception as e:
+            print(f"解析失败: {e}")
+            return {}
+    
+    def parse_recording_row(self, row) -> Optional[Dict]:
+        """
+        解析单个录音行的数据
+        """
+        try:
+            data = {}
+            
+            # 获取录音ID和基本信息
+            id_cell = row.find('td', class_='results-id')
+            if id_cell:
+                id_link = id_cell.find('a')
+                if id_link and id_link.get('href'):
+                    # 从URL中提取ID
+                    href = id_link.get('href')
+                    id_match = re.search(r'/(\d+)', href)
+                    if id_match:
+                        data['id'] = id_match.group(1)
+                        data['url'] = f"https://xeno-canto.org{href}"
+            
+            # 获取物种信息
+            species_cell = row.find('td', class_='results-species')
+            if species_cell:
+                species_link = species_cell.find('a')
+                if species_link:
+                    species_text = species_link.get_text(strip=True)
+                    # 解析学名和英文名
+                    if ' - ' in species_text:
+                        scientific, english = species_text.split(' - ', 1)
+                        data['scientific_name'] = scientific.strip()
+                        data['en'] = english.strip()
+                        
+                        # 分离属名和种名
+                        if ' ' in scientific:
+                            parts = scientific.split()
+                            data['gen'] = parts[0]
+                            data['sp'] = parts[1] if len(parts) > 1 else ''
+            
+            # 获取国家信息
+            country_cell = row.find('td', class_='results-country')
+            if country_cell:
+                data['cnt'] = country_cell.get_text(strip=True)
+            
+            # 获取地点信息
+            location_cell = row.find('td', class_='results-location')
+            if location_cell:
+                data['loc'] = location_cell.get_text(strip=True)
+            
+            # 获取录音者信息
+            recordist_cell = row.find('td', class_='results-recordist')
+            if recordist_cell:
+                data['rec'] = recordist_cell.get_text(strip=True)
+            
+            # 获取日期信息
+            date_cell = row.find('td', class_='results-date')
+            if date_cell:
+                data['date'] = date_cell.get_text(strip=True)
+            
+            # 获取声音类型
+            type_cell = row.find('td', class_='results-type')
+            if type_cell:
+                data['type'] = type_cell.get_text(strip=True)
+            
+            # 获取质量评级
+            quality_cell = row.find('td', class_='results-quality')
+            if quality_cell:
+                quality_text = quality_cell.get_text(strip=True)
+                data['q'] = quality_text
+            
+            return data if data else None
+            
+        except Exception as e:
+            print(f"解析录音行失败: {e}")
+            return None